@@ -0,0 +1,161 @@
+"""Synthetic survey generator with the same schema as the app's embedded sample.
+
+Writes ResponseId, EmployeeName, YearsCodePro, DevType, Country,
+LanguageHaveWorkedWith and ConvertedCompYearly in chunks, so 10M-row files can be
+generated in bounded memory. The output format follows the file extension
+(.csv, .parquet, .arrow/.feather).
+
+    python benchmarks/generate_survey.py --rows 1000000 --out /tmp/survey_1m.parquet
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 250_000
+
+# Popularity weights roughly follow the embedded sample's language counts.
+LANGUAGES = {
+    'JavaScript': 430, 'TypeScript': 380, 'SQL': 340, 'HTML/CSS': 330, 'C#': 200, 'Python': 160,
+    'Java': 65, 'Go': 55, 'Bash/Shell (all shells)': 45, 'Kotlin': 28, 'PowerShell': 18, 'PHP': 16,
+    'C++': 10, 'Ruby': 7, 'Dart': 6, 'C': 6, 'Rust': 5, 'Swift': 4, 'Scala': 3, 'Elixir': 2, 'R': 2,
+    'Perl': 2, 'Haskell': 2, 'F#': 2, 'Lua': 2, 'Groovy': 2, 'Objective-C': 1, 'Ada': 1, 'Clojure': 1,
+    'Lisp': 1, 'OCaml': 1, 'Raku': 1, 'Zig': 1, 'Solidity': 1, 'Julia': 1, 'MATLAB': 1, 'Erlang': 1,
+    'Fortran': 1, 'COBOL': 1, 'Delphi': 1, 'Assembly': 1, 'VBA': 1,
+}
+DEV_TYPES = {
+    'Developer, full-stack': 320, 'Developer, back-end': 120, 'Developer, front-end': 30,
+    'Data scientist or machine learning specialist': 24, 'Developer, mobile': 10,
+    'Developer, desktop or enterprise applications': 4, 'Developer, QA or test': 2,
+    'Senior Executive (C-Suite, VP, etc.)': 2, 'System administrator': 2, 'DevOps specialist': 3,
+    'Engineering manager': 3, 'Other (please specify):': 1,
+}
+# Country: (weight, median salary in USD)
+COUNTRIES = {
+    'United States of America': (380, 140000), 'United Kingdom of Great Britain and Northern Ireland': (50, 85000),
+    'Germany': (40, 75000), 'India': (45, 15000), 'Canada': (20, 95000), 'Brazil': (25, 30000),
+    'France': (15, 55000), 'Spain': (10, 40000), 'Netherlands': (8, 70000), 'Poland': (10, 45000),
+    'Australia': (8, 100000), 'Sweden': (6, 60000), 'Italy': (7, 40000), 'Russian Federation': (6, 35000),
+    'Ukraine': (5, 40000), 'Viet Nam': (3, 15000), 'Philippines': (3, 12000), 'Portugal': (5, 35000),
+    'Finland': (3, 60000), 'Israel': (4, 100000), 'Switzerland': (4, 130000), 'Japan': (3, 60000),
+    'Nigeria': (3, 10000), 'Iran, Islamic Republic of...': (3, 10000), 'Hong Kong (S.A.R.)': (2, 70000),
+    'Nomadic': (1, 60000),
+}
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William',
+               'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah',
+               'Charles', 'Karen', 'Wei', 'Priya', 'Ahmed', 'Olga', 'Sofia', 'Lucas', 'Chloé', 'José',
+               'Aisha', 'Kenji', 'Zoë', 'Mateus', 'Ana', 'Ivan', 'Fatima', 'Noah', 'Emma', 'Liam']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez',
+              'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore',
+              'Jackson', 'Martin', 'Lee', 'Müller', 'Schmidt', 'Kumar', 'Singh', 'Nguyen', 'Silva', 'Santos',
+              'Ivanov', 'Kowalski', 'Rossi', 'Dubois', 'Tanaka', 'Okafor', 'Cohen', 'Jansen', 'Novak']
+COLUMNS = ['ResponseId', 'EmployeeName', 'YearsCodePro', 'DevType', 'Country',
+           'LanguageHaveWorkedWith', 'ConvertedCompYearly']
+
+
+def _choice(rng, weights, size):
+    names = np.array(list(weights), dtype=object)
+    p = np.array([w[0] if isinstance(w, tuple) else w for w in weights.values()], dtype=np.float64)
+    codes = rng.choice(len(names), size=size, p=p / p.sum())
+    return names, codes
+
+
+def _languages(rng, size):
+    """Semicolon-joined, alphabetically ordered language lists with a long-tailed length."""
+    names = np.array(sorted(LANGUAGES), dtype=object)
+    weights = np.array([LANGUAGES[name] for name in names], dtype=np.float64)
+    lengths = np.minimum(1 + rng.negative_binomial(3, 0.45, size=size), len(names))
+    # Weighted sampling without replacement: the k largest Gumbel-perturbed log weights win
+    keys = np.log(weights) + rng.gumbel(size=(size, len(names)))
+    ranks = np.argsort(np.argsort(-keys, axis=1), axis=1)
+    chosen = ranks < lengths[:, None]
+    joined = pd.Series('', index=range(size), dtype=object)
+    for j, name in enumerate(names):
+        joined = joined.where(~chosen[:, j], joined + name + ';')
+    return joined.str[:-1]
+
+
+def generate_chunk(rng, start, size):
+    """One chunk of synthetic respondents with ResponseIds starting at start + 1."""
+    countries, country_codes = _choice(rng, COUNTRIES, size)
+    dev_types, dev_codes = _choice(rng, DEV_TYPES, size)
+    medians = np.array([median for _, median in COUNTRIES.values()], dtype=np.float64)
+
+    years = np.minimum(rng.gamma(2.0, 4.5, size=size).astype(np.int64), 50)
+    years_text = pd.Series(years.astype(str), dtype=object)
+    years_text[years == 0] = 'Less than 1 year'
+    years_text[years >= 50] = 'More than 50 years'
+
+    salary = medians[country_codes] * (0.6 + 0.04 * np.minimum(years, 25)) * rng.lognormal(0.0, 0.45, size=size)
+    salary = np.round(salary).astype(np.float64)
+    salary[rng.random(size) < 0.01] = np.nan
+
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), size)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), size)]
+    return pd.DataFrame({
+        'ResponseId': np.arange(start + 1, start + size + 1),
+        'EmployeeName': first + ' ' + last,
+        'YearsCodePro': years_text,
+        'DevType': dev_types[dev_codes],
+        'Country': countries[country_codes],
+        'LanguageHaveWorkedWith': _languages(rng, size).to_numpy(),
+        'ConvertedCompYearly': salary,
+    }, columns=COLUMNS)
+
+
+def _sample_style_lines(chunk):
+    """CSV lines in the embedded sample's style: DevType unquoted even when it contains commas."""
+    salary = chunk['ConvertedCompYearly'].map(lambda value: '' if np.isnan(value) else f"{value:.1f}")
+    return (chunk['ResponseId'].astype(str) + ',' + chunk['EmployeeName'] + ',' + chunk['YearsCodePro'] + ','
+            + chunk['DevType'] + ',' + chunk['Country'].where(~chunk['Country'].str.contains(','),
+                                                               '"' + chunk['Country'] + '"')
+            + ',"' + chunk['LanguageHaveWorkedWith'] + '",' + salary)
+
+
+def generate(path, rows, seed=0, chunk_rows=CHUNK_ROWS, sample_style=False):
+    """Writes a synthetic survey of the given size to path, chunk by chunk."""
+    rng = np.random.default_rng(seed)
+    extension = os.path.splitext(path)[1].lower()
+    writer = None
+    with open(path, 'w', encoding='utf-8', newline='') if extension == '.csv' else pa.OSFile(path, 'wb') as sink:
+        for start in range(0, rows, chunk_rows):
+            chunk = generate_chunk(rng, start, min(chunk_rows, rows - start))
+            if extension == '.csv':
+                if sample_style:
+                    if start == 0:
+                        sink.write(','.join(COLUMNS) + '\n')
+                    sink.write('\n'.join(_sample_style_lines(chunk)) + '\n')
+                else:
+                    chunk.to_csv(sink, header=start == 0, index=False)
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                if extension == '.parquet':
+                    writer = pq.ParquetWriter(sink, table.schema)
+                elif extension in ('.arrow', '.feather', '.ipc'):
+                    writer = pa.ipc.new_file(sink, table.schema)
+                else:
+                    raise ValueError(f"Unsupported output file type '{extension}'.")
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10_000, help="number of respondents (e.g. 10000, 1000000, 10000000)")
+    parser.add_argument('--out', required=True, help="output file (.csv, .parquet or .arrow)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample-style', action='store_true',
+                        help="write CSV like the embedded sample, with DevType commas left unquoted")
+    args = parser.parse_args()
+    generate(args.out, args.rows, seed=args.seed, sample_style=args.sample_style)
+    print(f"Wrote {args.rows:,} rows to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
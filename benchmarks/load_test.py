@@ -0,0 +1,355 @@
+"""Concurrent-session load test of the app against a real Streamlit server.
+
+Starts `streamlit run` on the app (or targets a running server with --url) and
+connects simulated sessions over Streamlit's WebSocket protocol, as browsers do,
+so every session gets its own script thread in one server process and shares its
+caches with the others. Each session clicks through the sidebar pages, searches
+names in the Data Explorer and switches the Global Insights map, pausing for a
+random think time between actions. Every rerun is timed from sending the widget
+change to the server's script-finished message.
+
+The JSON report has per-action p50/p95/p99 rerun latencies, throughput in reruns
+per second, errors and the peak resident memory of the server and its worker
+processes. Given a baseline report, actions whose p95 got slower than the tolerance
+are reported and the script exits with status 1.
+
+    python benchmarks/load_test.py --sessions 20 --rows 1000000 --output load.json
+    python benchmarks/load_test.py --sessions 20 --rows 1000000 --baseline load.json --tolerance 0.25
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.sync.client import connect
+
+from run_benchmarks import APP_DIR, MIN_DELTA, dataset
+
+PAGES = ["Data Explorer", "Technology Analysis", "Career Analysis", "Global Insights"]
+SEARCHES = ['son', 'mar', 'smith', 'jo', 'lee']
+# Widgets the sessions drive, by label
+PAGE_WIDGET = "Go to"
+SEARCH_WIDGET = "Enter a name to search for:"
+MAP_WIDGET = "Select Map to Display"
+WIDGET_TYPES = ('radio', 'selectbox', 'text_input')
+QUANTILES = {'p50': 50, 'p95': 95, 'p99': 99}
+RERUN_TIMEOUT = 300
+STARTUP_TIMEOUT = 120
+MEMORY_INTERVAL = 0.25
+
+
+# --- SESSIONS ---
+class Session:
+    """One simulated browser tab: a WebSocket connection and the widget values it has set."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.widgets = {}
+        self.states = {}
+        self.page = "Home"
+
+    def rerun(self):
+        """Asks for a rerun with the current widget states; returns (seconds, exception messages)."""
+        message = BackMsg()
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        self.connection.send(message.SerializeToString())
+        widgets, exceptions = {}, []
+        while True:
+            forward = ForwardMsg.FromString(self.connection.recv(timeout=RERUN_TIMEOUT))
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    exceptions.append("script compilation error")
+                break
+            if kind != 'delta' or forward.delta.WhichOneof('type') != 'new_element':
+                continue
+            element = forward.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type in WIDGET_TYPES:
+                widget = getattr(element, element_type)
+                widgets[widget.label] = widget
+            elif element_type == 'exception':
+                exceptions.append(element.exception.message)
+        self.widgets = widgets
+        return time.perf_counter() - start, exceptions
+
+    def set(self, label, value):
+        """Sets a widget of the last run, as a user would; a radio or selectbox takes one of its options."""
+        widget = self.widgets.get(label)
+        if widget is None:
+            raise LookupError(f"no widget labelled {label!r} on {self.page}")
+        state = WidgetState(id=widget.id)
+        state.string_value = value
+        self.states[label] = state
+
+
+def actions(rng, rounds):
+    """The (name, label, value) actions of one session, as a sequence of page visits and interactions."""
+    for _ in range(rounds):
+        for page in PAGES:
+            yield page, PAGE_WIDGET, page
+            if page == "Data Explorer":
+                yield f"{page} / name search", SEARCH_WIDGET, rng.choice(SEARCHES)
+            elif page == "Global Insights":
+                yield f"{page} / map", MAP_WIDGET, None
+
+
+def run_session(url, rounds, think_time, seed, record):
+    """Connects, loads Home and runs the actions, passing (action, seconds, exceptions) to record."""
+    rng = random.Random(seed)
+    with connect(url.replace('http', 'ws', 1).rstrip('/') + '/_stcore/stream', subprotocols=['streamlit'],
+                 max_size=None, open_timeout=STARTUP_TIMEOUT) as connection:
+        session = Session(connection)
+        record('Home', *session.rerun())
+        for name, label, value in actions(rng, rounds):
+            time.sleep(rng.uniform(0.5, 1.5) * think_time)
+            if label == PAGE_WIDGET:
+                session.page = value
+            elif label == MAP_WIDGET:
+                # Switch to whichever map is not showing
+                options = list(session.widgets[label].options) if label in session.widgets else []
+                current = session.states[label].string_value if label in session.states else next(iter(options), None)
+                value = next((option for option in options if option != current), None)
+            try:
+                session.set(label, value)
+            except LookupError as e:
+                record(name, None, [str(e)])
+                continue
+            record(name, *session.rerun())
+
+
+class Recorder:
+    """Collects rerun latencies and errors by action from every session thread."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name, seconds, exceptions):
+        with self._lock:
+            if seconds is not None:
+                self.latencies.setdefault(name, []).append(seconds)
+            if exceptions:
+                self.errors.setdefault(name, []).extend(exceptions)
+
+
+# --- SERVER ---
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(source):
+    """Starts a headless Streamlit server on the app; returns (process, url) once it is healthy."""
+    port = free_port()
+    env = dict(os.environ)
+    if source:
+        env['DATA_EXPLORER_SOURCE'] = source
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', os.path.join(APP_DIR, 'app.py'), '--server.headless', 'true',
+         '--server.port', str(port), '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false'],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The Streamlit server exited with status {process.returncode}.")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"The Streamlit server did not become healthy within {STARTUP_TIMEOUT} s.")
+
+
+def _status(pid, field):
+    """A memory field of /proc/<pid>/status in bytes, or 0 if the process is gone."""
+    try:
+        with open(f"/proc/{pid}/status") as handle:
+            for line in handle:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _descendants(pid):
+    children = []
+    for path in glob.glob(f"/proc/{pid}/task/*/children"):
+        try:
+            with open(path) as handle:
+                children.extend(int(child) for child in handle.read().split())
+        except OSError:
+            pass
+    return children + [grandchild for child in children for grandchild in _descendants(child)]
+
+
+class MemoryMonitor:
+    """Samples the resident memory of the server and its worker processes until stopped (Linux only)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak_total = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(MEMORY_INTERVAL):
+            total = sum(_status(pid, 'VmRSS') for pid in [self.pid] + _descendants(self.pid))
+            self.peak_total = max(self.peak_total, total)
+
+    def stop(self):
+        """Stops sampling; returns the server's own peak RSS and the peak RSS of server plus workers."""
+        self._stopped.set()
+        self._thread.join()
+        return {'server_peak_rss': _status(self.pid, 'VmHWM') or None, 'total_peak_rss': self.peak_total or None}
+
+
+# --- REPORT ---
+def summarise(latencies, errors):
+    """Per-action rerun counts, errors and latency percentiles in seconds."""
+    summary = {}
+    for name in sorted(set(latencies) | set(errors)):
+        timings = np.asarray(latencies.get(name, []))
+        entry = {'reruns': len(timings), 'errors': len(errors.get(name, []))}
+        if len(timings):
+            entry.update({label: float(np.percentile(timings, q)) for label, q in QUANTILES.items()})
+            entry.update({'mean': float(timings.mean()), 'max': float(timings.max())})
+        summary[name] = entry
+    return summary
+
+
+def regressions(actions, baseline, tolerance):
+    """(action, baseline p95, current p95) for actions slower than the tolerance allows."""
+    slower = []
+    for name, entry in actions.items():
+        before = baseline.get('actions', {}).get(name, {}).get('p95')
+        if before is None or 'p95' not in entry:
+            continue
+        if entry['p95'] > before * (1 + tolerance) and entry['p95'] - before > MIN_DELTA:
+            slower.append((name, before, entry['p95']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument('--rounds', type=int, default=3, help="times each session clicks through the pages")
+    parser.add_argument('--think-time', type=float, default=1.0,
+                        help="mean pause between a session's actions, in seconds")
+    parser.add_argument('--ramp-up', type=float, default=5.0, help="seconds over which the sessions start")
+    parser.add_argument('--url', help="test a running server instead of starting one (memory is then not measured)")
+    data = parser.add_mutually_exclusive_group()
+    data.add_argument('--source', help="survey file or directory for the started server (DATA_EXPLORER_SOURCE)")
+    data.add_argument('--rows', type=int, help="serve a synthetic survey with this many rows, generated on first use")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='parquet',
+                        help="file format of a generated survey")
+    parser.add_argument('--no-warmup', action='store_true',
+                        help="measure from a cold server instead of visiting every page once first")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the report as JSON to this file")
+    parser.add_argument('--baseline', help="JSON report of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    source = dataset(args.rows, args.format) if args.rows else args.source
+    process = None
+    url = args.url
+    if url is None:
+        print("Starting the Streamlit server")
+        process, url = start_server(source)
+    try:
+        if not args.no_warmup:
+            print("Warming up")
+            run_session(url, 1, 0, args.seed, lambda *_: None)
+        monitor = MemoryMonitor(process.pid) if process is not None else None
+
+        print(f"Running {args.sessions} sessions x {args.rounds} rounds")
+        recorder = Recorder()
+
+        def session(number):
+            time.sleep(args.ramp_up * number / max(args.sessions, 1))
+            try:
+                run_session(url, args.rounds, args.think_time, args.seed + 1 + number, recorder)
+            except Exception as e:
+                recorder('session', None, [f"{type(e).__name__}: {e}"])
+
+        threads = [threading.Thread(target=session, args=(number,)) for number in range(args.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+        memory = monitor.stop() if monitor is not None else {'server_peak_rss': None, 'total_peak_rss': None}
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    actions_summary = summarise(recorder.latencies, recorder.errors)
+    reruns = sum(len(timings) for timings in recorder.latencies.values())
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'source': source,
+        'sessions': args.sessions,
+        'rounds': args.rounds,
+        'think_time': args.think_time,
+        'ramp_up': args.ramp_up,
+        'seconds': seconds,
+        'reruns': reruns,
+        'throughput': reruns / seconds if seconds else None,
+        'errors': sum(entry['errors'] for entry in actions_summary.values()),
+        'memory': memory,
+        'actions': actions_summary,
+    }
+    for name, entry in actions_summary.items():
+        if 'p50' in entry:
+            print(f"  {name:<32} p50 {entry['p50'] * 1000:>8.0f} ms  p95 {entry['p95'] * 1000:>8.0f} ms  "
+                  f"p99 {entry['p99'] * 1000:>8.0f} ms  ({entry['reruns']} reruns, {entry['errors']} errors)")
+        else:
+            print(f"  {name:<32} {entry['errors']} errors")
+    print(f"{reruns} reruns in {seconds:.1f} s: {report['throughput']:.2f} reruns/s, {report['errors']} errors")
+    if memory['total_peak_rss']:
+        print(f"Peak memory: server {memory['server_peak_rss'] / 2**20:.0f} MiB, "
+              f"with workers {memory['total_peak_rss'] / 2**20:.0f} MiB")
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            slower = regressions(actions_summary, json.load(handle), args.tolerance)
+        for name, before, after in slower:
+            print(f"REGRESSION {name}: p95 {before * 1000:.0f} ms -> {after * 1000:.0f} ms")
+        if slower:
+            sys.exit(1)
+        print(f"No p95 regressions beyond {args.tolerance:.0%} of the baseline.")
+
+
+if __name__ == '__main__':
+    main()
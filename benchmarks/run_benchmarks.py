@@ -0,0 +1,253 @@
+"""Headless benchmarks for the app's data paths on synthetic surveys.
+
+For each dataset size this times the cold ingest into the columnar cache, warm
+reads, the Technology Trends counts (indexed and the original str.split approach),
+name search, the Global Insights country aggregation (exact group-by, cube,
+stratified-sample estimates and, with DuckDB installed, SQL over Parquet), figure
+construction, chunked CSV and Parquet exports of every row and an incremental
+upsert of 1% new and changed responses; the app's cold-start time to first render
+of the Home page is timed once. Results are written as JSON; given a baseline file
+from an earlier run, benchmarks that got slower than the tolerance are reported and
+the script exits with status 1.
+
+    python benchmarks/run_benchmarks.py --sizes 10000 1000000 --output results.json
+    python benchmarks/run_benchmarks.py --sizes 10000 --baseline results.json --tolerance 0.25
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(HERE), 'final_app')
+sys.path.insert(0, HERE)
+sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import plotly.express as px
+
+from approximate import StratifiedSample
+from country_codes import CountryCodeTable
+from cube import CompensationCube
+from data_source import DataSource
+from dataset_store import DatasetStore
+from export import WRITERS, export_file, iter_rows
+from generate_survey import generate, generate_chunk
+from incremental import update_cube, upsert
+from language_index import LanguageIndex, language_analytics
+from name_index import NameIndex
+from scatter_lod import bin_points
+from sql_backend import SQLEngine
+
+DEFAULT_SIZES = [10_000, 1_000_000]
+DATA_DIR = os.path.join(HERE, '.data')
+# The original expand=True split builds a respondents x max-languages frame; skip it above this.
+LEGACY_LIMIT = 1_000_000
+# Slowdowns smaller than this many seconds are treated as noise.
+MIN_DELTA = 0.005
+
+SEARCHES = {'substring': 'son', 'prefix': 'mar', 'fuzzy': 'jon smiht'}
+# Times the first script run of the app in a fresh interpreter, as a new server worker would do it.
+COLD_START = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter()
+app.run()
+print(time.perf_counter() - start, 'plotly.express' in sys.modules)
+"""
+
+
+class Timer:
+    """Runs callables a number of times and keeps the timings by benchmark name."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def __call__(self, name, function, repeat=None):
+        timings = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+        self.record(name, timings)
+        return result
+
+    def record(self, name, timings):
+        self.results[name] = {'best': min(timings), 'median': statistics.median(timings), 'runs': len(timings)}
+        print(f"  {name:<32} {min(timings) * 1000:>10.1f} ms")
+
+
+def dataset(rows, data_format):
+    """Path of the synthetic survey with this many rows, generated on first use."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"survey-{rows}.{data_format}")
+    if not os.path.exists(path):
+        print(f"Generating {rows:,} rows -> {path}")
+        generate(path, rows)
+    return path
+
+
+def exact_country_stats(store):
+    """Respondents and exact median salary per country, by a full group-by: the baseline for the cube."""
+    return store.frame(['Country', 'ConvertedCompYearly']).groupby('Country', observed=True).agg(
+        RespondentCount=('ConvertedCompYearly', 'count'), MedianSalary=('ConvertedCompYearly', 'median')).reset_index()
+
+
+def run_size(rows, data_format, repeat, legacy_limit):
+    path = dataset(rows, data_format)
+    cache_dir = tempfile.mkdtemp(prefix='survey-bench-')
+    timer = Timer(repeat)
+    print(f"{rows:,} rows")
+    try:
+        # --- LOADING ---
+        def cold_build():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            return DataSource(path=path, cache_dir=cache_dir).build_cache()
+        timer('load.cold_build', cold_build, repeat=1)
+        source = DataSource(path=path, cache_dir=cache_dir)
+        df = timer('load.warm_read', source.read)
+        store = DatasetStore.from_source(source)
+
+        # --- TECHNOLOGY TRENDS ---
+        if rows <= legacy_limit:
+            timer('technology.legacy_split',
+                  lambda: df['LanguageHaveWorkedWith'].str.split(';', expand=True).stack().value_counts())
+        languages = store.column('LanguageHaveWorkedWith')
+        timer('technology.index_from_strings', lambda: LanguageIndex.from_series(languages))
+        codes = store.ragged('LanguageCodes')
+        index = timer('technology.index_build', lambda: LanguageIndex.from_ragged(codes))
+        tech_df = timer('technology.top15', lambda: index.top_counts(15))
+        salaries = store.column('ConvertedCompYearly')
+        timer('technology.analytics', lambda: language_analytics(index, salaries, None, 15))
+
+        # --- NAME SEARCH ---
+        names = store.column('EmployeeName')
+        name_index = timer('search.index_build', lambda: NameIndex.from_series(names))
+        for mode, query in SEARCHES.items():
+            timer(f"search.{mode}", lambda: name_index.search(query, mode))
+
+        # --- GLOBAL INSIGHTS ---
+        country_stats = timer('country.exact_median', lambda: exact_country_stats(store))
+        frame = store.frame(['Country', 'DevType', 'YearsCode', 'ConvertedCompYearly'])
+        cube = timer('country.cube_build', lambda: CompensationCube(frame, index))
+        timer('country.cube_rollup', lambda: cube.rollup(['Country']))
+        timer('country.cube_rollup_language', lambda: cube.rollup(['Country'], {'Language': ['Python']}))
+        sample = timer('approximate.sample_build', lambda: StratifiedSample(store))
+        timer('approximate.country_rollup', lambda: sample.rollup('Country'))
+        timer('approximate.language_analytics', lambda: sample.language_analytics((), 15))
+
+        # --- SQL BACKEND ---
+        # Only with DuckDB installed; the engine caches results, so each query is timed once
+        if importlib.util.find_spec('duckdb') is not None:
+            sql = timer('sql.parquet_copy', lambda: SQLEngine(store), repeat=1)
+            timer('sql.country_rollup', lambda: sql.rollup(['Country']), repeat=1)
+            timer('sql.country_rollup_language', lambda: sql.rollup(['Country'], {'Language': ['Python']}), repeat=1)
+            timer('sql.language_analytics', lambda: sql.language_analytics((), 15), repeat=1)
+
+        # --- FIGURES ---
+        codes = CountryCodeTable(cache_dir=cache_dir)
+        country_stats = country_stats.assign(iso_alpha=codes.lookup(country_stats['Country']).to_numpy())
+        timer('figure.technology_bar',
+              lambda: px.bar(tech_df, x='Count', y='Technology', orientation='h').to_json())
+        timer('figure.choropleth',
+              lambda: px.choropleth(country_stats, locations='iso_alpha', color='MedianSalary').to_json())
+        scatter = store.frame(['YearsCode', 'ConvertedCompYearly', 'DevType'])
+        timer('figure.scatter_bins', lambda: px.scatter(
+            bin_points(scatter, 'YearsCode', 'ConvertedCompYearly', 'DevType', (0, 40), (1000, 400000)),
+            x='YearsCode', y='ConvertedCompYearly', color='DevType', size='Count').to_json())
+
+        # --- EXPORTS ---
+        for extension in WRITERS:
+            timer(f"export.{extension}", lambda: export_file(iter_rows(store), extension).close(), repeat=1)
+
+        # --- UPSERTS ---
+        # Half of the batch replaces existing responses, the other half is new
+        batch = generate_chunk(np.random.default_rng(1), rows - rows // 200, max(rows // 100, 1))
+        result = timer('upsert.write', lambda: upsert(store, batch), repeat=1)
+        new_store = result.store
+        timer('upsert.cube', lambda: update_cube(cube, store, new_store))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return timer.results
+
+
+def run_cold_start(repeat):
+    """Time to first render of the Home page in fresh processes; Plotly must not be imported for it."""
+    print("App")
+    timer = Timer(repeat)
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', COLD_START, os.path.join(APP_DIR, 'app.py')], cwd=APP_DIR,
+                                capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(output[0]))
+        if output[1] == 'True':
+            print("  warning: rendering Home imported plotly.express")
+    timer.record('app.cold_start_home', timings)
+    return timer.results
+
+
+def regressions(results, baseline, tolerance):
+    """(size, name, baseline best, current best) for benchmarks slower than the tolerance allows."""
+    slower = []
+    for size, benchmarks in results.items():
+        for name, timing in benchmarks.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            if timing['best'] > before['best'] * (1 + tolerance) and timing['best'] - before['best'] > MIN_DELTA:
+                slower.append((size, name, before['best'], timing['best']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="dataset sizes in rows (e.g. 10000 1000000 10000000)")
+    parser.add_argument('--format', choices=['csv', 'parquet', 'arrow'], default='csv',
+                        help="file format of the generated surveys")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark; the best run is compared")
+    parser.add_argument('--legacy-limit', type=int, default=LEGACY_LIMIT,
+                        help="largest size to run the original str.split technology count on")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'format': args.format,
+        'repeat': args.repeat,
+        'results': {str(rows): run_size(rows, args.format, args.repeat, args.legacy_limit) for rows in args.sizes},
+    }
+    report['results']['app'] = run_cold_start(args.repeat)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            slower = regressions(report['results'], json.load(handle), args.tolerance)
+        for size, name, before, after in slower:
+            where = f" at {int(size):,} rows" if size.isdigit() else ""
+            print(f"REGRESSION {name}{where}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        if slower:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline.")
+
+
+if __name__ == '__main__':
+    main()
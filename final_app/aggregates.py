@@ -0,0 +1,198 @@
+"""Shared, memoized filter engine for the analysis pages, and the LRU cache behind it.
+
+Pages describe their filters declaratively, as tuples of ``(column, op, value)``
+predicates. The row masks and row positions they select live in one bounded LRU
+cache keyed on (dataset version, filters), so the same filter set asked for by any
+session, or by the same page on a later rerun, is a lookup. Aggregates are rolled
+up from the compensation cube rather than grouped here, but pages can keep their
+tables in the same cache. Cached results are shared between sessions and must be
+treated as read-only.
+"""
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+from memory_budget import budget
+
+OPERATORS = {
+    '==': lambda column, value: column == value,
+    '<': lambda column, value: column < value,
+    '<=': lambda column, value: column <= value,
+    '>': lambda column, value: column > value,
+    '>=': lambda column, value: column >= value,
+    'in': lambda column, value: column.isin(value),
+}
+
+
+def predicate(column, op, value):
+    """Builds a hashable filter predicate; 'in' values are sorted so equal sets share a key."""
+    if op not in OPERATORS:
+        raise ValueError(f"Unsupported filter operator '{op}'.")
+    if op == 'in':
+        value = tuple(sorted(value))
+    return (column, op, value)
+
+
+def canonical(filters):
+    """Orders and deduplicates predicates so equivalent filter sets share cache entries."""
+    return tuple(sorted(set(filters), key=repr))
+
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping that evicts the least recently used entry.
+
+    With ``sizeof`` and ``max_bytes`` the cache is also bounded by the total size of its
+    values, as measured by ``sizeof(value)``. With a ``MemoryBudget`` its entries also
+    count against the process-wide budget, which may spill them to disk (or drop them)
+    when other caches need the memory; spilled entries are read back on their next get.
+    """
+
+    def __init__(self, max_entries, max_bytes=None, sizeof=None, budget=None, name=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (budget.sizeof if budget is not None else None)
+        self.budget = budget
+        self.nbytes = 0
+        self.spilled_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._used = {}
+        self._spilled = OrderedDict()
+        self._lock = threading.Lock()
+        if budget is not None:
+            budget.register(self, name or type(self).__name__)
+            weakref.finalize(self, budget.discard_all, self._spilled)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                if self.budget is not None:
+                    self._used[key] = self.budget.tick()
+                return self._entries[key]
+            spilled = self._spilled.pop(key, None)
+            if spilled is None:
+                self.misses += 1
+                return None
+            self.spilled_bytes -= spilled[1]
+        # Read back outside the lock, so other keys stay available meanwhile
+        try:
+            value = self.budget.load(spilled[0])
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.put(key, value)
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.sizeof is not None and value is not None else 0
+        stale = None
+        with self._lock:
+            self.nbytes += size - self._sizes.pop(key, 0)
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            if self.budget is not None:
+                self._used[key] = self.budget.tick()
+                stale = self._spilled.pop(key, None)
+                if stale is not None:
+                    self.spilled_bytes -= stale[1]
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or
+                                              (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                evicted, _ = self._entries.popitem(last=False)
+                self.nbytes -= self._sizes.pop(evicted)
+                self._used.pop(evicted, None)
+        if self.budget is not None:
+            if stale is not None:
+                self.budget.discard(stale[0])
+            self.budget.enforce()
+        return value
+
+    def oldest(self):
+        """(last-use stamp, key) of the least recently used entry held in memory, or None."""
+        with self._lock:
+            for key in self._entries:
+                return self._used[key], key
+        return None
+
+    def release(self, key):
+        """Moves an entry out of memory: spilled to disk if the budget can write it, else dropped."""
+        with self._lock:
+            if key not in self._entries:
+                return
+            value = self._entries.pop(key)
+            size = self._sizes.pop(key)
+            self.nbytes -= size
+            self._used.pop(key, None)
+        path = self.budget.spill(value) if value is not None else None
+        if path is None:
+            return
+        dropped = []
+        with self._lock:
+            if key in self._entries:
+                # Put again while it was being written; the file is already stale
+                dropped.append(path)
+            else:
+                self._spilled[key] = (path, size)
+                self.spilled_bytes += size
+                while len(self._spilled) > self.max_entries:
+                    _, (evicted, evicted_size) = self._spilled.popitem(last=False)
+                    self.spilled_bytes -= evicted_size
+                    dropped.append(evicted)
+        for path in dropped:
+            self.budget.discard(path)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries) + list(self._spilled)
+
+    def __len__(self):
+        return len(self._entries) + len(self._spilled)
+
+
+class AggregationEngine:
+    """Answers filter requests for one dataset version from a shared LRU cache."""
+
+    def __init__(self, version, load_columns, max_entries=256):
+        self.version = version
+        self.load_columns = load_columns
+        self.cache = LRUCache(max_entries, budget=budget, name='aggregates')
+
+    def _cached(self, key, compute):
+        key = (self.version,) + key
+        result = self.cache.get(key)
+        if result is None:
+            result = self.cache.put(key, compute())
+        return result
+
+    def mask(self, filters):
+        """Boolean row mask for a filter set; each predicate's mask is cached on its own."""
+        filters = canonical(filters)
+        if not filters:
+            return None
+        if len(filters) == 1:
+            return self._predicate_mask(filters[0])
+        return self._cached(('mask', filters),
+                            lambda: np.logical_and.reduce([self._predicate_mask(p) for p in filters]))
+
+    def _predicate_mask(self, predicate):
+        def compute():
+            column, op, value = predicate
+            return OPERATORS[op](self.load_columns([column])[column], value).to_numpy(dtype=bool)
+        return self._cached(('mask', (predicate,)), compute)
+
+    def cached(self, name, key, compute):
+        """A page's result for this version, cached under (name, key) and computed by compute() on a miss."""
+        return self._cached(('result', name, key), compute)
+
+    def rows(self, filters):
+        """Row positions matching a filter set, or None when nothing is filtered."""
+        filters = canonical(filters)
+        if not filters:
+            return None
+        return self._cached(('rows', filters), lambda: np.flatnonzero(self.mask(filters)))
@@ -1,8 +1,16 @@
+import os
+import uuid
+from importlib.machinery import ModuleSpec
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from pycountry_convert import country_name_to_country_alpha3
-import io
+from instrumentation import Metrics, RerunProfile
+from loader import DatasetLoader
+# Everything else (pandas, Plotly, the data modules, the country database) is imported
+# by the helper or page that first needs it, so Home paints without loading any of it.
+
+# Streamlit runs this script as the __main__ module; without a spec, worker processes
+# spawned while it runs would run the whole script again as their own main module
+__spec__ = ModuleSpec('__main__', None)
 
 # --- THE DATA IS NOW EMBEDDED DIRECTLY IN THE CODE ---
 # This eliminates all file-related errors.
@@ -528,56 +536,349 @@ st.set_page_config(
 )
 
 # --- HELPER FUNCTIONS ---
-@st.cache_data
-def load_data():
-    """Loads the clean, pre-processed data from the embedded string."""
+def open_dataset():
+    """Opens the survey data source named by DATA_EXPLORER_SOURCE, or the embedded sample."""
+    from data_source import open_source
+    return open_source(text=csv_data_string)
+
+@st.cache_resource
+def get_loader():
+    """Starts warming the dataset in the background as soon as the first session runs the script."""
+    return DatasetLoader(open_dataset)
+
+def get_source():
+    return get_loader().source
+
+def prepare_data():
+    """Waits for the background load, showing its progress, and returns the store (None on failure)."""
+    loader = get_loader()
+    if not loader.ready:
+        progress_bar = st.progress(0.0, text="Preparing the survey data...")
+        while not loader.wait(0.2):
+            progress_bar.progress(loader.fraction, text=f"Preparing the survey data... {loader.rows_read:,} rows read")
+        progress_bar.empty()
     try:
-        # Read the data directly from the string variable using io.StringIO
-        df = pd.read_csv(io.StringIO(csv_data_string))
-        
-        # Rename columns for consistency
-        df = df.rename(columns={'YearsCodePro': 'YearsCode'})
-        # Ensure data types are correct for plotting
-        df['ConvertedCompYearly'] = pd.to_numeric(df['ConvertedCompYearly'], errors='coerce')
-        df['YearsCode'] = pd.to_numeric(df['YearsCode'], errors='coerce')
-        # Drop rows with missing data in key columns to prevent errors
-        df = df.dropna(subset=['ConvertedCompYearly', 'YearsCode', 'Country', 'LanguageHaveWorkedWith', 'DevType'])
-        return df
+        return loader.result()
     except Exception as e:
         st.error(f"A critical error occurred while processing the data: {e}")
         return None
 
-def get_iso_alpha3(country_name):
-    """Converts country name to ISO alpha-3 code for mapping."""
-    try:
-        if country_name == 'United Kingdom of Great Britain and Northern Ireland':
-            return 'GBR'
-        if country_name == 'Russian Federation':
-            return 'RUS'
-        return country_name_to_country_alpha3(country_name)
-    except:
-        return None
+@st.fragment(run_every=0.5)
+def refresh_when_loaded():
+    """Reruns the page once the background load has finished, so the sidebar can show the data."""
+    if get_loader().ready:
+        st.rerun()
+
+def load_data(columns=None):
+    """Returns a shared, read-only frame over the given columns (all of them by default)."""
+    return store.frame(columns)
+
+# Structures derived from the dataset are held per server process for the latest versions
+# and rebuilt for a version produced by an upsert. The name index counts against the memory
+# budget; the column index and the engines keep their data in budgeted caches of their own.
+@st.cache_resource
+def name_indexes():
+    from incremental import Derived
+    from memory_budget import budget
+    from name_index import NameIndex
+    return Derived(lambda store: NameIndex.from_series(store.column('EmployeeName')), budget=budget, name='name index')
+
+def get_name_index():
+    """The EmployeeName search index of this run's dataset version."""
+    return name_indexes().get(store)
+
+@st.cache_resource
+def column_indexes():
+    from column_index import ColumnIndex
+    from incremental import Derived
+    return Derived(lambda store: ColumnIndex(store, filter_numeric_columns(store), FILTER_CATEGORICAL_COLUMNS))
+
+def filter_numeric_columns(store):
+    """The numeric filter columns, plus the survey year for a multi-year dataset."""
+    return FILTER_NUMERIC_COLUMNS + (['Year'] if store.partitions else [])
+
+def get_column_index():
+    """Profiles the filterable columns once per dataset version; filter bitmaps are built on first use."""
+    return column_indexes().get(store)
+
+@st.cache_resource
+def engines():
+    from aggregates import AggregationEngine
+    from incremental import Derived
+    return Derived(lambda store: AggregationEngine(store.version, store.frame))
+
+def get_engine():
+    """The aggregation engine of this run's dataset version, shared by every session."""
+    return engines().get(store)
+
+@st.cache_resource
+def sql_engines():
+    from incremental import Derived
+    from sql_backend import SQLEngine
+    return Derived(SQLEngine)
+
+def get_sql_engine(dataset=None):
+    """The DuckDB engine over this run's dataset version, or over another store such as a year to compare with."""
+    return sql_engines().get(store if dataset is None else dataset)
+
+def cube_for(dataset=None):
+    """(cube, is_fresh) for this run's dataset or another store: the SQL engine, or the cube built in the background."""
+    if SQL_BACKEND:
+        return get_sql_engine(dataset), True
+    return background_result('cube', dataset=dataset)
+
+@st.cache_resource
+def background_tasks():
+    from background import BackgroundTasks
+    return BackgroundTasks()
+
+def get_background():
+    """One worker pool per server process; the compensation cube of this run's dataset starts building right away."""
+    tasks = background_tasks()
+    tasks.submit(store, 'cube')
+    return tasks
+
+@st.fragment(run_every=0.5)
+def refresh_when_ready(name, args, dataset):
+    """Polls a background artifact and reruns the page once its fresh result has arrived."""
+    if get_background().fetch(dataset, name, *args)[1]:
+        st.rerun()
+
+def background_result(name, *args, dataset=None):
+    """Returns (artifact, is_fresh): the requested artifact if ready, else the latest one while it computes.
+
+    Artifacts are computed on this run's dataset unless another store (a year to compare with) is given.
+    """
+    dataset = store if dataset is None else dataset
+    tasks = get_background()
+    result, fresh = tasks.fetch(dataset, name, *args)
+    if result is None:
+        with st.spinner("Computing..."):
+            return tasks.wait(dataset, name, *args), True
+    if not fresh:
+        st.caption("⏳ Showing the previous results while these are computed in the background.")
+        refresh_when_ready(name, args, dataset)
+    return result, fresh
+
+def exact_or_estimate(name, args, estimate):
+    """Returns (artifact, is_fresh, is_estimate) for a background artifact.
+
+    In approximate mode the exact artifact is only used once it is ready; until then
+    estimate() answers, as (result, is_fresh), while the exact one computes and a rerun
+    is scheduled for when it arrives. Otherwise this waits for it like background_result.
+    """
+    if not approximate:
+        return background_result(name, *args) + (False,)
+    result, fresh = get_background().fetch(store, name, *args)
+    if fresh:
+        return result, True, False
+    refresh_when_ready(name, args, store)
+    return estimate() + (True,)
+
+def estimate(method, *args):
+    """(result, is_fresh) of one of the stratified sample's estimators."""
+    sample, fresh = background_result('sample')
+    return getattr(sample, method)(*args), fresh
+
+def approximate_caption():
+    from approximate import CONFIDENCE
+    sample = background_result('sample')[0]
+    st.caption(f"⚡ Estimated from a stratified sample of {sample.size:,} of {sample.num_rows:,} responses, with "
+               f"{CONFIDENCE:.0%} confidence intervals. Exact results are computing in the background and replace these "
+               "when ready.")
+
+@st.cache_resource
+def session_selections():
+    """Row positions selected by every session, counted against the process memory budget."""
+    from aggregates import LRUCache
+    from memory_budget import budget
+    return LRUCache(MAX_SESSION_SELECTIONS, budget=budget, name='selections')
+
+def session_selection(name, view, compute):
+    """This session's selection for a view, recomputed by compute() when the view changes.
+
+    Selections live in the shared selections cache rather than in session state, so the
+    memory budget can spill an idle session's rows to disk; they are read back on use.
+    """
+    key = (st.session_state.setdefault('session_key', uuid.uuid4().hex), name)
+    rows = session_selections().get(key) if st.session_state.get(f'{name}_view') == view else None
+    if rows is None:
+        rows = session_selections().put(key, compute())
+        st.session_state[f'{name}_view'] = view
+    return rows
+
+@st.cache_resource
+def country_code_table():
+    from country_codes import CountryCodeTable
+    return CountryCodeTable(get_source().cache_dir)
+
+@st.cache_resource
+def country_codes():
+    from incremental import Derived
+    return Derived(lambda store: country_code_table().update(store.column('Country').cat.categories))
+
+def get_country_codes():
+    """Resolves every distinct country in the dataset to an ISO alpha-3 code, once per dataset version."""
+    return country_codes().get(store)
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide performance metrics, fed by every session's reruns."""
+    return Metrics()
+
+@st.cache_resource
+def get_figures():
+    """One figure store per server process, shared by every session."""
+    from figure_store import FigureStore
+    return FigureStore()
+
+def cached_figure(name, options, build, fresh=True):
+    """Returns the page's figure for these options, built by build() only the first time it is asked for.
+
+    Figures drawn from a stale background result are built for this rerun but not cached.
+    """
+    with run_profile.stage('figure'):
+        if not fresh:
+            from figure_store import serialise
+            return serialise(build())
+        return get_figures().get((store.version, page, name, options), build)
+
+def show_chart(entry):
+    """Renders a cached figure as the render stage, recording its serialised size when that is measured."""
+    with run_profile.stage('render'):
+        st.plotly_chart(entry.figure, use_container_width=True)
+    if run_profile.measure_payloads:
+        run_profile.payload(entry.figure.layout.title.text or 'chart', len(entry.spec))
+
+def export_tables(tables):
+    """An Export expander with a CSV and a Parquet download button per table.
+
+    ``tables`` maps a label to (file name, table), where a table is a frame or a callable
+    returning an iterable of frames. Files are written in chunks when a download is
+    clicked, on Streamlit's download thread rather than in the script run.
+    """
+    from export import FORMATS, export_file
+    with st.expander("⬇️ Export"):
+        for label, (name, table) in tables.items():
+            frames = table if callable(table) else (lambda table=table: [table])
+            columns = st.columns([3] + [1] * len(FORMATS))
+            columns[0].write(label)
+            for column, (format_label, (extension, mime)) in zip(columns[1:], FORMATS.items()):
+                column.download_button(format_label, lambda frames=frames, extension=extension: export_file(frames(), extension),
+                                       file_name=f"{name}.{extension}", mime=mime, on_click='ignore',
+                                       key=f'export_{name}_{extension}')
+
+# Columns each analysis page reads, so a page only pays for the data it touches
+PAGE_COLUMNS = {
+    "Career Analysis": ['YearsCode', 'ConvertedCompYearly', 'DevType', 'EmployeeName'],
+}
+
+# Pages that analyse one survey year of a multi-year dataset at a time, or compare two
+ANALYSIS_PAGES = ["Technology Analysis", "Career Analysis", "Global Insights"]
+ALL_YEARS = "All years"
+
+# Rows per page of the Data Explorer table, and the columns its filter panel offers
+EXPLORER_PAGE_SIZE = 200
+# Explorer selections kept across sessions; older ones are recomputed on their session's next rerun
+MAX_SESSION_SELECTIONS = 1024
+FILTER_NUMERIC_COLUMNS = ['YearsCode', 'ConvertedCompYearly']
+FILTER_CATEGORICAL_COLUMNS = ['Country', 'DevType']
+
+# Filters the pages declare, as (column, op, value) predicates; the rows they select come
+# from the shared aggregation engine
+CAREER_FILTERS = (('ConvertedCompYearly', '<', 400000), ('ConvertedCompYearly', '>', 1000), ('YearsCode', '<=', 40))
+CAREER_YEARS_RANGE = (0, 40)
+CAREER_SALARY_RANGE = (1000, 400000)
+
+# With DATA_EXPLORER_BACKEND=duckdb the analysis pages query Parquet copies of the data with
+# DuckDB instead of building indexes and cubes in memory; the Data Explorer reads the store either way
+SQL_BACKEND = os.environ.get('DATA_EXPLORER_BACKEND', 'memory') == 'duckdb'
 
 # --- INITIAL DATA LOADING ---
-# Automatically load the data into session state when the script runs
-if 'df' not in st.session_state:
-    st.session_state.df = load_data()
+# Every rerun is timed stage by stage, from here to the end of the script
+run_profile = RerunProfile()
+# Start warming the shared dataset; only the analysis pages wait for it
+loader = get_loader()
 
 # --- SIDEBAR ---
 with st.sidebar:
     st.title("💻 IT Industry Data Explorer")
     st.write("An interactive dashboard analyzing IT Industry Survey Data.")
-    
-    # Show data overview if data is loaded
-    if st.session_state.df is not None:
-        st.markdown("---")
-        st.write("### Data Overview")
-        st.write(f"**Rows:** {st.session_state.df.shape[0]}")
-        st.write(f"**Columns:** {st.session_state.df.shape[1]}")
+    overview = st.container()
     
     st.markdown("---")
     st.header("Choose Analysis Page")
     page = st.radio("Go to", ["Home", "Data Explorer", "Technology Analysis", "Career Analysis", "Global Insights"])
+    # The SQL backend answers exactly without building anything in memory first, so it has no approximate mode
+    approximate = not SQL_BACKEND and st.toggle(
+        "⚡ Fast approximate mode", key='approximate',
+        help="Answer the analysis pages from a stratified sample, with confidence intervals, "
+             "while exact results are computed in the background.")
+    year_controls = st.container()
+    st.markdown("---")
+    show_performance = st.checkbox("Show performance panel", key='show_performance')
+
+# Chart payloads are only serialised a second time when someone looks at their sizes
+run_profile.page = page
+run_profile.measure_payloads = show_performance or bool(get_metrics().metrics_file)
+
+store = None
+if page != "Home":
+    with run_profile.stage('data'):
+        store = prepare_data()
+elif loader.ready and loader.error is None:
+    store = loader.store
+
+# Show data overview if data is loaded
+with overview:
+    if store is not None:
+        st.markdown("---")
+        st.write("### Data Overview")
+        st.write(f"**Rows:** {store.num_rows}")
+        st.write(f"**Columns:** {len(store.column_names)}")
+        if store.partitions:
+            st.write("**Years:** " + ", ".join(f"{year} ({partition.num_rows:,})"
+                                               for year, partition in store.partitions.items()))
+        if loader.updates:
+            upserted = sum(stats.rows_written for stats, _ in loader.updates)
+            replaced = sum(replaced for _, replaced in loader.updates)
+            st.caption(f"{upserted:,} responses upserted since the server started, {replaced:,} of them replacing older ones.")
+        report = get_source().ingest_report()
+        if report is not None and report.dropped:
+            with st.expander(f"{sum(report.dropped.values())} rows dropped while loading"):
+                for reason, count in report.dropped.items():
+                    st.write(f"{reason}: {count}")
+        with st.expander("Memory by column"):
+            # Mapped bytes live in the shared cache file; loaded bytes are this process's own view of them
+            st.dataframe(store.memory_usage(), hide_index=True)
+        from memory_budget import budget
+        st.write(f"**Cache memory:** {budget.nbytes / 2**20:,.1f} of {budget.limit / 2**20:,.1f} MiB "
+                 f"({budget.spilled_bytes / 2**20:,.1f} MiB spilled to disk)")
+        with st.expander("Memory by cache"):
+            # Results, indexes, bitmaps, figures and selections shared by this server process's sessions
+            st.dataframe(budget.usage(), hide_index=True)
+            st.caption(f"{budget.spills:,} entries spilled, {budget.reloads:,} read back, {budget.drops:,} dropped.")
+            if budget.limit < budget.total:
+                st.caption(f"The {budget.total / 2**20:,.1f} MiB budget is split evenly between this server process "
+                           "and its background workers; each keeps its own caches within its share.")
+    elif not loader.ready:
+        st.markdown("---")
+        st.caption("Loading the survey data in the background...")
+        refresh_when_loaded()
+
+# A multi-year dataset is analysed one year (partition) at a time, optionally against another year;
+# from here on the analysis pages' store is that year's
+year = compare = previous = None
+if store is not None and store.partitions and page in ANALYSIS_PAGES:
+    with year_controls:
+        year = st.selectbox("Survey year", [None] + store.years, format_func=lambda year: str(year or ALL_YEARS),
+                            key='survey_year')
+        if year is not None:
+            compare = st.selectbox("Compare with", [None] + [other for other in store.years if other != year],
+                                   format_func=lambda year: str(year or "(none)"), key='compare_year')
+    if compare is not None:
+        previous = store.partition(compare)
+    store = store.partition(year)
 
 # --- MAIN PAGE CONTENT ---
 if page == "Home":
@@ -588,65 +889,430 @@ if page == "Home":
     """)
 
 # Check if data failed to load
-elif st.session_state.df is None:
+elif store is None:
     st.error("Data could not be loaded. Please check the script.")
 
 elif page == "Data Explorer":
+    import numpy as np
+    import pandas as pd
+    from column_index import contains, to_rows
+    from export import iter_rows
     st.title("📊 Data Explorer")
     st.header("Explore the Dataset")
     
-    df_explorer = st.session_state.df.copy()
-
     st.subheader("Search by Employee Name")
-    search_name = st.text_input("Enter a name to search for:")
-    
-    if search_name:
-        df_explorer = df_explorer[df_explorer['EmployeeName'].str.contains(search_name, case=False, na=False)]
+    col1, col2 = st.columns([3, 2])
+    search_name = col1.text_input("Enter a name to search for:")
+    search_mode = col2.radio("Match", ["Contains", "Starts with", "Similar to"], horizontal=True)
 
-    st.dataframe(df_explorer)
+    st.subheader("Filter by Column")
+    with run_profile.stage('data'):
+        column_index = get_column_index()
+    ranges, categories = {}, {}
+    with st.expander("Filters", expanded=False):
+        filter_cols = st.columns(2)
+        for i, column in enumerate(filter_numeric_columns(store)):
+            profile = column_index.profiles[column]
+            with filter_cols[i % 2]:
+                ranges[column] = st.slider(column, float(profile.min), float(profile.max),
+                                           (float(profile.min), float(profile.max)), key=f'filter_{column}')
+                st.bar_chart(pd.DataFrame({'Rows': profile.counts}, index=profile.edges[:-1].round(1)), height=100)
+        for i, column in enumerate(FILTER_CATEGORICAL_COLUMNS):
+            profile = column_index.profiles[column]
+            counts = dict(zip(profile.values, profile.counts))
+            categories[column] = filter_cols[i % 2].multiselect(
+                column, profile.values, format_func=lambda value, counts=counts: f"{value} ({counts[value]})",
+                key=f'filter_{column}')
+
+    # Only the visible page of rows is sent to the browser; sorting uses the store's pre-sorted indexes
+    col1, col2, col3 = st.columns([2, 1, 1])
+    sort_column = col1.selectbox("Sort by", ["(none)"] + store.column_names, key='explorer_sort')
+    ascending = col2.radio("Order", ["Ascending", "Descending"], horizontal=True, key='explorer_order') == "Ascending"
+
+    # The session keeps only the selected row positions, in the budgeted selections cache;
+    # the rows themselves stay in the shared store
+    def select_rows():
+        rows = None
+        filter_bitmap = column_index.select(categories, ranges)
+        if search_name:
+            modes = {"Contains": 'substring', "Starts with": 'prefix', "Similar to": 'fuzzy'}
+            rows = get_name_index().search(search_name, modes[search_mode])
+            if filter_bitmap is not None:
+                rows = rows[contains(filter_bitmap, rows)]
+        elif filter_bitmap is not None:
+            rows = to_rows(filter_bitmap, store.num_rows)
+        if sort_column != "(none)":
+            rows = store.sorted_rows(sort_column, rows, ascending)
+        return rows
+
+    selection_view = (store.version, search_name, search_mode, sort_column, ascending, repr(ranges), repr(categories))
+    with run_profile.stage('filter'):
+        rows = session_selection('explorer_rows', selection_view, select_rows)
+    total = store.num_rows if rows is None else len(rows)
+    page_count = max(1, -(-total // EXPLORER_PAGE_SIZE))
+
+    # Start from the first page whenever the search or the sort changes
+    view = (search_name, search_mode, sort_column, ascending, repr(ranges), repr(categories))
+    if st.session_state.get('explorer_view') != view:
+        st.session_state.explorer_view = view
+        st.session_state.explorer_page = 1
+    st.session_state.explorer_page = min(st.session_state.get('explorer_page', 1), page_count)
+    page_number = col3.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key='explorer_page')
+
+    start = (page_number - 1) * EXPLORER_PAGE_SIZE
+    stop = min(start + EXPLORER_PAGE_SIZE, total)
+    window = np.arange(start, stop) if rows is None else rows[start:stop]
+    with run_profile.stage('data'):
+        table = store.frame(rows=window)
+    with run_profile.stage('render'):
+        st.dataframe(table)
+    if run_profile.measure_payloads:
+        run_profile.payload('table', table.memory_usage(deep=True).sum())
+    st.caption(f"Showing rows {start + 1 if total else 0}–{stop} of {total}")
+    # The whole selection, in the table's order, is read from the store chunk by chunk on download.
+    # Downloads run off the script thread, without this session's state, so the rows are bound here
+    export_tables({f"All {total:,} rows of this view": ('survey-rows', lambda: iter_rows(store, rows))})
 
 elif page == "Technology Analysis":
+    import plotly.express as px
+    from aggregates import canonical, predicate
     st.title("📈 Technology Analysis")
+    with run_profile.stage('data'):
+        if SQL_BACKEND:
+            country_options, dev_type_options = get_sql_engine().values('Country'), get_sql_engine().values('DevType')
+        else:
+            df_filters = load_data(['Country', 'DevType'])
+            country_options = sorted(df_filters['Country'].cat.categories)
+            dev_type_options = sorted(df_filters['DevType'].cat.categories)
+    col1, col2 = st.columns(2)
+    countries = col1.multiselect("Filter by Country", country_options)
+    dev_types = col2.multiselect("Filter by Developer Type", dev_type_options)
+    filters = []
+    if countries:
+        filters.append(predicate('Country', 'in', countries))
+    if dev_types:
+        filters.append(predicate('DevType', 'in', dev_types))
+    filters = canonical(filters)
+    with run_profile.stage('aggregate'):
+        if SQL_BACKEND:
+            (tech_df, cooccurrence_df, salary_df), fresh, estimated = get_sql_engine().language_analytics(filters, 15), True, False
+        else:
+            (tech_df, cooccurrence_df, salary_df), fresh, estimated = exact_or_estimate(
+                'language_analytics', (filters, 15), lambda: estimate('language_analytics', filters, 15))
+    suffix = " (estimated)" if estimated else ""
+
+    def build_technologies():
+        top = tech_df.head(15)
+        error = {'error_x': top['CountHigh'] - top['Count'], 'error_x_minus': top['Count'] - top['CountLow']} if estimated else {}
+        fig = px.bar(top, x='Count', y='Technology', orientation='h', title='Top 15 Most Used Technologies' + suffix, **error)
+        fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig
+
+    def build_salaries():
+        # Estimates show the median's confidence interval, exact results the interquartile range
+        low, high, interval = ('MedianLow', 'MedianHigh', '95% Confidence Interval') if estimated else ('Q1', 'Q3', 'Interquartile Range')
+        fig = px.bar(salary_df, x='MedianSalary', y='Technology', orientation='h',
+                     error_x=salary_df[high] - salary_df['MedianSalary'],
+                     error_x_minus=salary_df['MedianSalary'] - salary_df[low],
+                     hover_data=[low, high, 'Respondents'], title=f'Median Annual Salary (USD) with {interval}{suffix}',
+                     labels={'MedianSalary': 'Median Annual Salary (USD)'})
+        fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig
+
+    options = (filters, estimated)
     st.header("Most Popular Technologies")
-    df = st.session_state.df
-    tech_counts = df['LanguageHaveWorkedWith'].str.split(';', expand=True).stack().value_counts()
-    tech_df = pd.DataFrame({'Technology': tech_counts.index, 'Count': tech_counts.values})
-    fig = px.bar(tech_df.head(15), x='Count', y='Technology', orientation='h', title='Top 15 Most Used Technologies')
-    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-    st.plotly_chart(fig, use_container_width=True)
+    show_chart(cached_figure('technologies', options, build_technologies, fresh))
+
+    st.header("Technologies Used Together")
+    show_chart(cached_figure('cooccurrence', options, lambda: px.imshow(
+        cooccurrence_df, color_continuous_scale=px.colors.sequential.Viridis, labels={'color': 'Respondents'},
+        title='Co-occurrence of the Top 15 Technologies' + suffix), fresh))
+
+    st.header("Salary by Technology")
+    show_chart(cached_figure('salaries', options, build_salaries, fresh))
+    if estimated:
+        approximate_caption()
+    export_tables({
+        "Technology counts": ('technology-counts', tech_df),
+        "Co-occurrence of the top technologies": ('technology-cooccurrence',
+                                                  cooccurrence_df.rename_axis('Technology').reset_index()),
+        "Salary by technology": ('technology-salaries', salary_df),
+    })
+
+    if previous is not None:
+        # Shares of each year's filtered respondents, so years of different sizes compare
+        def language_shares(dataset):
+            if SQL_BACKEND:
+                engine = get_sql_engine(dataset)
+                counts, total, fresh = engine.language_analytics(filters, 15)[0], engine.count(filters), True
+            else:
+                (counts, _, _), counts_fresh = background_result('language_analytics', filters, 15, dataset=dataset)
+                total, total_fresh = background_result('row_count', filters, dataset=dataset)
+                fresh = counts_fresh and total_fresh
+            return counts.assign(Share=counts['Count'] * 100 / max(total, 1)), fresh
+
+        with run_profile.stage('aggregate'):
+            shares, shares_fresh = language_shares(store)
+            shares_before, before_fresh = language_shares(previous)
+
+        def build_share_change():
+            change = shares.head(15).merge(shares_before[['Technology', 'Share']], on='Technology', how='left',
+                                           suffixes=('', f' {compare}'))
+            change['Change'] = change['Share'] - change[f'Share {compare}']
+            fig = px.bar(change, x='Change', y='Technology', orientation='h', hover_data=['Share', f'Share {compare}'],
+                         title=f'Change in Share of Respondents since {compare} (percentage points)',
+                         labels={'Change': 'Percentage points', 'Share': f'Share {year} (%)'})
+            fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+            return fig
+
+        st.header(f"{year} Compared with {compare}")
+        show_chart(cached_figure('share_change', (filters, previous.version), build_share_change,
+                                 shares_fresh and before_fresh))
+        st.caption("Languages not offered in the earlier survey have no bar. Comparisons use exact results.")
 
 elif page == "Career Analysis":
+    import pandas as pd
+    import plotly.express as px
+    from aggregates import canonical, predicate
+    from export import iter_rows
+    from scatter_lod import POINT_THRESHOLD, stratified_sample
     st.title("📉 Career Analysis")
     st.header("Experience vs. Compensation")
-    df = st.session_state.df
 
-    df_filtered = df[(df['ConvertedCompYearly'] < 400000) & (df['ConvertedCompYearly'] > 1000)]
-    df_filtered = df_filtered[pd.to_numeric(df_filtered['YearsCode'], errors='coerce') <= 40]
-    
-    fig_scatter = px.scatter(df_filtered, x='YearsCode', y='ConvertedCompYearly', color='DevType',
-                             hover_name='EmployeeName', title='Salary vs. Years of Professional Coding Experience',
-                             labels={'YearsCode': 'Years of Professional Coding Experience', 'ConvertedCompYearly': 'Annual Salary (USD)'})
-    st.plotly_chart(fig, use_container_width=True)
+    # Narrowing the region is the zoom: full points come back once few enough rows fall inside it
+    col1, col2, col3 = st.columns([2, 2, 1])
+    years_range = col1.slider("Years of experience", *CAREER_YEARS_RANGE, CAREER_YEARS_RANGE)
+    salary_range = col2.slider("Annual salary (USD)", *CAREER_SALARY_RANGE, CAREER_SALARY_RANGE, step=1000)
+    if not approximate:
+        detail = col3.radio("Detail", ["Auto", "All points", "Density bins", "Sample"], key="career_detail")
+    filters = CAREER_FILTERS + (predicate('YearsCode', '>=', years_range[0]), predicate('YearsCode', '<=', years_range[1]),
+                                predicate('ConvertedCompYearly', '>=', salary_range[0]),
+                                predicate('ConvertedCompYearly', '<=', salary_range[1]))
+    labels = {'YearsCode': 'Years of Professional Coding Experience', 'ConvertedCompYearly': 'Annual Salary (USD)'}
+    title = 'Salary vs. Years of Professional Coding Experience'
+
+    if approximate:
+        # Points come from the stratified sample; the region's size is estimated until the exact count arrives
+        with run_profile.stage('aggregate'):
+            count, _, estimated = exact_or_estimate('row_count', (canonical(filters),), lambda: estimate('count', filters))
+            sample, fresh = background_result('sample')
+        with run_profile.stage('filter'):
+            points = stratified_sample(sample.frame[sample.mask(filters)], 'DevType', POINT_THRESHOLD)
+        fig_scatter = cached_figure('scatter', (canonical(filters), 'approximate'), lambda: px.scatter(
+            points, x='YearsCode', y='ConvertedCompYearly', color='DevType', hover_name='EmployeeName',
+            title=f"{title} (sampled)", labels=labels), fresh)
+        if estimated:
+            count, low, high = count
+            st.caption(f"About {count:,.0f} respondents in range (95% CI {low:,.0f}–{high:,.0f}); "
+                       f"showing {len(points)} sampled points.")
+        else:
+            st.caption(f"{count} respondents in range; showing {len(points)} sampled points.")
+        show_chart(fig_scatter)
+        if estimated:
+            approximate_caption()
+    else:
+        if SQL_BACKEND:
+            with run_profile.stage('filter'):
+                count = get_sql_engine().count(filters)
+        else:
+            with run_profile.stage('data'):
+                df = load_data(PAGE_COLUMNS[page])
+            with run_profile.stage('filter'):
+                rows = get_engine().rows(filters)
+            count = len(rows)
+        if detail == "Auto":
+            detail = "All points" if count <= POINT_THRESHOLD else "Density bins"
+
+        if detail == "Density bins":
+            with run_profile.stage('aggregate'):
+                if SQL_BACKEND:
+                    binned, fresh = get_sql_engine().scatter_bins(filters, 'YearsCode', 'ConvertedCompYearly', 'DevType',
+                                                                  years_range, salary_range), True
+                else:
+                    binned, fresh = background_result('scatter_bins', canonical(filters), years_range, salary_range)
+            fig_scatter = cached_figure('scatter', (canonical(filters), detail), lambda: px.scatter(
+                binned, x='YearsCode', y='ConvertedCompYearly', color='DevType', size='Count', hover_data=['Count'],
+                title=f"{title} ({count} respondents, binned)", labels=labels), fresh)
+        else:
+            def build_scatter():
+                if SQL_BACKEND:
+                    df_filtered = get_sql_engine().points(PAGE_COLUMNS[page], filters,
+                                                          POINT_THRESHOLD if detail == "Sample" else None, 'DevType')
+                else:
+                    df_filtered = df.iloc[rows]
+                    if detail == "Sample":
+                        df_filtered = stratified_sample(df_filtered, 'DevType', POINT_THRESHOLD)
+                return px.scatter(df_filtered, x='YearsCode', y='ConvertedCompYearly', color='DevType',
+                                  hover_name='EmployeeName', title=title, labels=labels)
+            fig_scatter = cached_figure('scatter', (canonical(filters), detail), build_scatter)
+        st.caption(f"{count} respondents in range; showing {detail.lower()}.")
+        show_chart(fig_scatter)
+
+    # The respondents in range are only selected and read when the export is downloaded
+    engine = get_sql_engine() if SQL_BACKEND else get_engine()
+
+    def respondents_in_range():
+        if SQL_BACKEND:
+            return engine.iter_points(PAGE_COLUMNS[page], filters)
+        return iter_rows(store, engine.rows(filters), PAGE_COLUMNS[page])
+    export_tables({"Respondents in range": ('career-respondents', respondents_in_range)})
+
+    if previous is not None:
+        # Each year's experience curve rolls up from its own partition's cube
+        with run_profile.stage('aggregate'):
+            cube, cube_fresh = cube_for()
+            cube_before, before_fresh = cube_for(previous)
+
+        def build_experience_curves():
+            curves = pd.concat([cube.rollup(['ExperienceBand']).assign(Year=str(year)),
+                                cube_before.rollup(['ExperienceBand']).assign(Year=str(compare))])
+            return px.line(curves.rename(columns={0.5: 'MedianSalary'}), x='ExperienceBand', y='MedianSalary',
+                           color='Year', markers=True, hover_data=['Count'],
+                           category_orders={'ExperienceBand': cube.values('ExperienceBand')},
+                           title=f'Median Annual Salary (USD) by Experience, {year} and {compare}',
+                           labels={'ExperienceBand': 'Years of Professional Coding Experience',
+                                   'MedianSalary': 'Median Annual Salary (USD)'})
+
+        st.header(f"{year} Compared with {compare}")
+        show_chart(cached_figure('experience_curves', previous.version, build_experience_curves,
+                                 cube_fresh and before_fresh))
 
 elif page == "Global Insights":
+    import plotly.express as px
     st.title("🌍 Global Insights")
     st.header("Global Developer Distribution and Salaries")
-    df = st.session_state.df
-    country_stats = df.groupby('Country').agg(
-        RespondentCount=('ResponseId', 'count'),
-        MedianSalary=('ConvertedCompYearly', 'median')
-    ).reset_index()
-    country_stats['iso_alpha'] = country_stats['Country'].apply(get_iso_alpha3)
-    country_stats = country_stats.dropna(subset=['iso_alpha'])
+    with run_profile.stage('aggregate'):
+        if SQL_BACKEND:
+            cube, fresh, estimated = get_sql_engine(), True, False
+        else:
+            # Until the cube is ready in approximate mode, the stratified sample answers the same roll-ups
+            cube, fresh, estimated = exact_or_estimate('cube', (), lambda: background_result('sample'))
+    suffix = " (estimated)" if estimated else ""
+    col1, col2, col3 = st.columns(3)
+    filters = {
+        'DevType': col1.multiselect("Filter by Developer Type", cube.values('DevType')),
+        'ExperienceBand': col2.multiselect("Filter by Experience", cube.values('ExperienceBand')),
+        'Language': col3.multiselect("Filter by Technology", cube.values('Language')),
+    }
+    options = (tuple((name, tuple(values)) for name, values in sorted(filters.items())), estimated)
+
+    def country_table():
+        if estimated:
+            stats = cube.rollup('Country', filters)
+        else:
+            stats = cube.rollup(['Country'], filters).rename(columns={'Count': 'RespondentCount', 0.5: 'MedianSalary'})
+        stats['iso_alpha'] = get_country_codes().lookup(stats['Country'])
+        return stats
+
+    # The country table is cached per version and filter selection like the figures, so switching
+    # maps reruns neither the roll-up nor the code lookup; a stale cube's table is not cached
+    with run_profile.stage('aggregate'):
+        country_stats = get_engine().cached('country_stats', options, country_table) if fresh else country_table()
+    unresolved = country_stats['iso_alpha'].isna()
+    if unresolved.any():
+        st.caption(f"{unresolved.sum()} countries ({country_stats.loc[unresolved, 'RespondentCount'].sum()} respondents) "
+                   "could not be mapped to an ISO code and are not shown. Add them to country_overrides.csv.")
+    country_stats = country_stats[~unresolved]
     
     map_type = st.selectbox("Select Map to Display", ["Median Annual Salary (USD)", "Number of Survey Respondents"])
     
-    if map_type == "Median Annual Salary (USD)":
-        fig = px.choropleth(country_stats, locations="iso_alpha", color="MedianSalary",
-                            hover_name="Country", color_continuous_scale=px.colors.sequential.Plasma,
-                            title="Global Median Developer Salaries")
+    # Both maps and the role chart are cached per filter selection, so switching maps is a lookup;
+    # data a figure alone needs is prepared inside its build function and skipped on a hit
+
+    def build_map():
+        # Estimated maps carry each country's confidence intervals in the hover
+        intervals = {'hover_data': ['MedianLow', 'MedianHigh', 'CountLow', 'CountHigh']} if estimated else {}
+        if map_type == "Median Annual Salary (USD)":
+            return px.choropleth(country_stats, locations="iso_alpha", color="MedianSalary",
+                                 hover_name="Country", color_continuous_scale=px.colors.sequential.Plasma,
+                                 title="Global Median Developer Salaries" + suffix, **intervals)
+        return px.choropleth(country_stats, locations="iso_alpha", color="RespondentCount",
+                             hover_name="Country", color_continuous_scale=px.colors.sequential.Viridis,
+                             title="Global Distribution of Survey Respondents" + suffix, **intervals)
+
+    def role_table():
+        if estimated:
+            return cube.rollup('DevType', filters)
+        return cube.rollup(['DevType'], filters, quantiles=(0.25, 0.5, 0.75)).rename(
+            columns={'Count': 'RespondentCount', 0.25: 'Q1', 0.5: 'MedianSalary', 0.75: 'Q3'})
+
+    def build_roles():
+        role_stats = role_table()
+        if estimated:
+            low, high, interval = 'MedianLow', 'MedianHigh', ' with 95% Confidence Interval'
+        else:
+            low, high, interval = 'Q1', 'Q3', ''
+        fig = px.bar(role_stats, x='MedianSalary', y='DevType', orientation='h',
+                     error_x=role_stats[high] - role_stats['MedianSalary'],
+                     error_x_minus=role_stats['MedianSalary'] - role_stats[low],
+                     hover_data=[low, high, 'RespondentCount'],
+                     title=f'Median Annual Salary (USD) by Developer Role{interval}{suffix}',
+                     labels={'MedianSalary': 'Median Annual Salary (USD)', 'DevType': 'Developer Role'})
+        fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig
+
+    show_chart(cached_figure('map', (options, map_type), build_map, fresh))
+
+    st.header("Salary by Developer Role")
+    show_chart(cached_figure('roles', options, build_roles, fresh))
+    if estimated:
+        approximate_caption()
+    elif SQL_BACKEND:
+        st.caption("Salaries are exact medians computed by DuckDB from the Parquet copy of the data. "
+                   "With several technologies selected, a respondent counts once per matching technology.")
     else:
-        fig = px.choropleth(country_stats, locations="iso_alpha", color="RespondentCount",
-                            hover_name="Country", color_continuous_scale=px.colors.sequential.Viridis,
-                            title="Global Distribution of Survey Respondents")
-    st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"Salaries roll up from a pre-aggregated cube and are accurate to within {cube.relative_accuracy:.1%}. "
+                   "With several technologies selected, a respondent counts once per matching technology.")
+    export_tables({
+        "Country statistics": ('country-stats', country_stats),
+        "Salary by developer role": ('role-salaries', lambda: [role_table()]),
+    })
+
+    if previous is not None:
+        with run_profile.stage('aggregate'):
+            cube_before, before_fresh = cube_for(previous)
+
+        def build_salary_change():
+            before = cube_before.rollup(['Country'], filters).rename(columns={0.5: f'MedianSalary {compare}'})
+            change = country_stats.merge(before[['Country', f'MedianSalary {compare}']], on='Country')
+            change['Change'] = (change['MedianSalary'] / change[f'MedianSalary {compare}'] - 1) * 100
+            return px.choropleth(change, locations="iso_alpha", color="Change", hover_name="Country",
+                                 hover_data=['MedianSalary', f'MedianSalary {compare}'],
+                                 color_continuous_scale=px.colors.diverging.RdBu, color_continuous_midpoint=0,
+                                 title=f"Change in Median Developer Salary since {compare} (%){suffix}",
+                                 labels={'Change': 'Change (%)', 'MedianSalary': f'MedianSalary {year}'})
+
+        st.header(f"{year} Compared with {compare}")
+        show_chart(cached_figure('salary_change', (options, previous.version), build_salary_change,
+                                 fresh and before_fresh))
+
+# --- PERFORMANCE ---
+# Recorded after the page has rendered, so the panel reports this rerun's stages
+get_metrics().record(run_profile.finish())
+if loader.ready:
+    get_metrics().observe_startup('dataset_load', loader.seconds)
+if show_performance:
+    import pandas as pd
+    with st.sidebar:
+        st.write("### Performance")
+        st.write(f"**This run:** {run_profile.seconds * 1000:.0f} ms"
+                 + (f", {run_profile.rss / 2**20:.0f} MiB resident" if run_profile.rss is not None else ""))
+        if run_profile.stages:
+            st.dataframe(pd.DataFrame([{'Stage': stage['stage'], 'ms': round(stage['seconds'] * 1000, 1),
+                                        'Memory Δ (MiB)': None if stage['memory_delta'] is None
+                                        else round(stage['memory_delta'] / 2**20, 1)} for stage in run_profile.stages]),
+                         hide_index=True)
+        if run_profile.payloads:
+            st.write("**Payloads:** " + ", ".join(f"{payload['name']} {payload['bytes'] / 1024:.0f} KiB"
+                                                  for payload in run_profile.payloads))
+        figures = get_figures().cache
+        st.write(f"**Figure cache:** {len(figures)} figures, {figures.nbytes / 2**20:.1f} MiB, "
+                 f"{figures.hits} hits / {figures.misses} misses")
+        startup = get_metrics().startup
+        if startup:
+            st.write("**Cold start:** " + ", ".join(f"{phase.replace('_', ' ')} {seconds * 1000:.0f} ms"
+                                                   for phase, seconds in startup.items()))
+        with st.expander("All sessions"):
+            st.dataframe(pd.DataFrame(get_metrics().summary()), hide_index=True)
+        st.download_button("Download metrics", get_metrics().to_prometheus(), file_name='metrics.prom',
+                           mime='text/plain')
@@ -0,0 +1,224 @@
+"""Stratified sample of the dataset for fast, approximate answers with confidence intervals.
+
+Respondents are sampled per Country (the stratum): each country keeps its share of
+SAMPLE_ROWS, but at least MIN_STRATUM_ROWS rows (or all of them), so small countries
+still get usable medians. Sampling is one Bernoulli draw per row, so building the
+sample is a single pass whatever the dataset size, and every answer afterwards costs
+the same for 10k or 50M rows.
+
+Counts are stratified estimates, sum over strata of N_h times the stratum's sample
+mean, with normal confidence intervals from the within-stratum variances. Quantiles
+are weighted sample quantiles; their intervals come from the binomial distribution
+of the rank (Woodruff's method), using the Kish effective sample size of each group.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from aggregates import OPERATORS
+from cube import EXPERIENCE_BANDS, EXPERIENCE_LABELS
+from language_index import LanguageIndex
+from memory_budget import nbytes
+
+SAMPLE_ROWS = 100_000
+MIN_STRATUM_ROWS = 1_000
+BUILD_CHUNK = 1_000_000
+# Two-sided 95% normal quantile
+Z = 1.959964
+CONFIDENCE = 0.95
+
+STRATUM = 'Country'
+COLUMNS = ['Country', 'DevType', 'YearsCode', 'ConvertedCompYearly', 'EmployeeName']
+
+
+def _stratified_totals(sums, squares, population, sampled):
+    """Estimated totals per group and their standard errors from per-(stratum, group) sample sums.
+
+    ``sums`` and ``squares`` are strata x groups sums of a per-row value and of its square
+    over each stratum's sampled rows (rows outside a group count as zero).
+    """
+    n = np.maximum(sampled, 1)[:, None].astype(np.float64)
+    N = population[:, None].astype(np.float64)
+    mean = sums / n
+    variance = np.maximum(squares / n - mean ** 2, 0) * n / np.maximum(n - 1, 1)
+    total = (N * mean).sum(axis=0)
+    error = np.sqrt((N ** 2 * (1 - n / np.maximum(N, 1)) * variance / n).sum(axis=0))
+    return total, error
+
+
+def _quantile_intervals(values, weights, groups, num_groups, q):
+    """Weighted q-quantile per group with its rank-based confidence interval.
+
+    Returns (estimate, low, high, sampled rows) arrays indexed by group; groups without
+    rows get NaN.
+    """
+    order = np.lexsort((values, groups))
+    values, weights, groups = values[order], weights[order], groups[order]
+    sizes = np.bincount(groups, minlength=num_groups)
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    totals = np.bincount(groups, weights=weights, minlength=num_groups)
+    squares = np.bincount(groups, weights=weights ** 2, minlength=num_groups)
+    # Cumulative weight fraction within the group, offset by the group number so one
+    # searchsorted finds positions for every group at once
+    within = np.cumsum(weights) - np.repeat(np.cumsum(totals) - totals, sizes)
+    keys = groups + within / np.repeat(np.maximum(totals, 1e-300), sizes)
+
+    effective = totals ** 2 / np.maximum(squares, 1e-300)
+    spread = Z * np.sqrt(q * (1 - q) / np.maximum(effective, 1))
+    present = sizes > 0
+
+    def at(fraction):
+        position = np.searchsorted(keys, np.arange(num_groups) + np.clip(fraction, 0, 1))
+        result = np.full(num_groups, np.nan)
+        result[present] = values[np.clip(position, starts, ends - 1)[present]]
+        return result
+
+    return at(np.full(num_groups, q)), at(q - spread), at(q + spread), sizes
+
+
+class StratifiedSample:
+    """Rows sampled per Country with their weights, and the language index of the sampled rows."""
+
+    def __init__(self, store, sample_rows=SAMPLE_ROWS, min_stratum_rows=MIN_STRATUM_ROWS, seed=0):
+        self.version = store.version
+        self.num_rows = store.num_rows
+        strata = store.column(STRATUM).cat.codes.to_numpy()
+        self.population = np.bincount(strata[strata >= 0], minlength=len(store.column(STRATUM).cat.categories))
+        wanted = np.maximum(min_stratum_rows, np.ceil(sample_rows * self.population / max(self.num_rows, 1)))
+        rate = np.minimum(wanted, self.population) / np.maximum(self.population, 1)
+
+        rng = np.random.default_rng(seed)
+        rows = []
+        for start in range(0, self.num_rows, BUILD_CHUNK):
+            chunk = strata[start:start + BUILD_CHUNK]
+            rows.append(start + np.flatnonzero(rng.random(len(chunk)) < rate[chunk]))
+        self.rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+        self.frame = store.frame(COLUMNS, rows=self.rows).reset_index(drop=True)
+        self.strata = strata[self.rows]
+        self.sampled = np.bincount(self.strata, minlength=len(self.population))
+        self.weights = (self.population / np.maximum(self.sampled, 1))[self.strata]
+        self.languages = LanguageIndex.from_ragged(store.ragged('LanguageCodes').take(self.rows))
+        self.bands = np.digitize(self.frame['YearsCode'].to_numpy(), EXPERIENCE_BANDS[1:])
+        self.labels = {
+            'Country': np.asarray(self.frame['Country'].cat.categories, dtype=object),
+            'DevType': np.asarray(self.frame['DevType'].cat.categories, dtype=object),
+            'ExperienceBand': np.asarray(EXPERIENCE_LABELS, dtype=object),
+            'Language': self.languages.vocabulary,
+        }
+
+    @property
+    def size(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        return nbytes([self.rows, self.frame, self.strata, self.weights, self.bands, self.languages])
+
+    def values(self, dimension):
+        return list(self.labels[dimension])
+
+    def _codes(self, dimension):
+        if dimension == 'ExperienceBand':
+            return self.bands
+        return self.frame[dimension].cat.codes.to_numpy()
+
+    # --- ENGINE-STYLE FILTERS ---
+    def mask(self, filters):
+        """Boolean mask over the sampled rows for (column, op, value) predicates."""
+        keep = np.ones(self.size, dtype=bool)
+        for column, op, value in filters:
+            keep &= OPERATORS[op](self.frame[column], value).to_numpy(dtype=bool)
+        return keep
+
+    def count(self, filters):
+        """Estimated number of respondents matching the predicates, as (estimate, low, high)."""
+        hits = self.mask(filters).astype(np.float64)
+        sums = np.bincount(self.strata, weights=hits, minlength=len(self.population))[:, None]
+        total, error = _stratified_totals(sums, sums, self.population, self.sampled)
+        return total[0], max(total[0] - Z * error[0], 0.0), total[0] + Z * error[0]
+
+    # --- CUBE-STYLE ROLL-UPS ---
+    def _multiplicity(self, filters):
+        """How many times each sampled row counts under cube filters (label lists per dimension).
+
+        As in the compensation cube, a respondent counts once per matching language.
+        """
+        multiplicity = np.ones(self.size)
+        for name, values in (filters or {}).items():
+            if not values:
+                continue
+            wanted = pd.Index(self.labels[name]).get_indexer(list(values))
+            wanted = wanted[wanted >= 0]
+            if name == 'Language':
+                multiplicity *= np.asarray(self.languages.matrix[:, wanted].sum(axis=1)).ravel()
+            else:
+                multiplicity *= np.isin(self._codes(name), wanted)
+        return multiplicity
+
+    def rollup(self, by, filters=None, quantile=0.5):
+        """Estimated RespondentCount and MedianSalary per label of one dimension, with 95% intervals.
+
+        Columns are the dimension, RespondentCount, CountLow, CountHigh, MedianSalary,
+        MedianLow, MedianHigh and Sampled (sampled rows behind each estimate).
+        """
+        multiplicity = self._multiplicity(filters)
+        groups = self._codes(by).astype(np.int64)
+        num_groups = len(self.labels[by])
+        keys = self.strata.astype(np.int64) * num_groups + groups
+        shape = (len(self.population), num_groups)
+        sums = np.bincount(keys, weights=multiplicity, minlength=shape[0] * shape[1]).reshape(shape)
+        squares = np.bincount(keys, weights=multiplicity ** 2, minlength=shape[0] * shape[1]).reshape(shape)
+        count, error = _stratified_totals(sums, squares, self.population, self.sampled)
+
+        used = multiplicity > 0
+        median, low, high, sampled = _quantile_intervals(
+            self.frame['ConvertedCompYearly'].to_numpy(dtype=np.float64)[used], (self.weights * multiplicity)[used],
+            groups[used], num_groups, quantile)
+        present = np.flatnonzero(sampled)
+        return pd.DataFrame({
+            by: self.labels[by][present],
+            'RespondentCount': np.rint(count[present]).astype(np.int64),
+            'CountLow': np.maximum(count - Z * error, 0)[present],
+            'CountHigh': (count + Z * error)[present],
+            'MedianSalary': median[present],
+            'MedianLow': low[present],
+            'MedianHigh': high[present],
+            'Sampled': sampled[present],
+        })
+
+    # --- TECHNOLOGY ---
+    def language_analytics(self, filters, top_n=15):
+        """Approximate language counts, co-occurrence and salary medians, like language_analytics.
+
+        The counts frame adds CountLow/CountHigh and the salary frame MedianLow/MedianHigh
+        (95% intervals); Q1/Q3 are not estimated.
+        """
+        keep = self.mask(filters)
+        selected = sparse.diags(keep.astype(np.float64)) @ self.languages.matrix
+        strata = sparse.csr_matrix((np.ones(self.size), (self.strata, np.arange(self.size))),
+                                   shape=(len(self.population), self.size))
+        sums = (strata @ selected).toarray()
+        count, error = _stratified_totals(sums, sums, self.population, self.sampled)
+        order = self.languages.ranking(count)
+        vocabulary = self.languages.vocabulary
+        tech_df = pd.DataFrame({'Technology': vocabulary[order], 'Count': np.rint(count[order]).astype(np.int64),
+                                'CountLow': np.maximum(count - Z * error, 0)[order],
+                                'CountHigh': (count + Z * error)[order]})
+
+        top = order[:top_n]
+        weighted = sparse.diags(self.weights * keep) @ self.languages.matrix
+        cooccurrence = (self.languages.matrix.T @ weighted).toarray()[np.ix_(top, top)]
+        cooccurrence_df = pd.DataFrame(np.rint(cooccurrence).astype(np.int64),
+                                       index=vocabulary[top], columns=vocabulary[top])
+
+        pairs = keep[self.languages.respondents]
+        respondents = self.languages.respondents[pairs]
+        median, low, high, sampled = _quantile_intervals(
+            self.frame['ConvertedCompYearly'].to_numpy(dtype=np.float64)[respondents], self.weights[respondents],
+            self.languages.codes[pairs].astype(np.int64), len(vocabulary), 0.5)
+        salary_df = pd.DataFrame({'Technology': vocabulary[top], 'MedianSalary': median[top], 'MedianLow': low[top],
+                                  'MedianHigh': high[top], 'Respondents': np.rint(count[top]).astype(np.int64),
+                                  'Sampled': sampled[top]})
+        return tech_df, cooccurrence_df, salary_df
@@ -0,0 +1,170 @@
+"""Process pool that computes heavy page artifacts off the Streamlit script thread.
+
+Workers map the same Arrow cache file as the server, so the dataset's pages are
+shared through the OS page cache rather than copied into each process; only small
+results travel back. Pages ask for an artifact and get the last finished result
+straight away while a fresh one is computed, then swap it in when it is ready.
+
+Every request names the dataset store it is for: the whole dataset or one year's
+partition. When a dataset moves to a new version, the previous version's results
+for the same request keep being served until the new ones arrive; a request with
+new arguments has no earlier result and is waited for (or estimated). Incremental artifacts (the cube) are
+handed their previous version's result, which the worker updates through the
+version's delta instead of building it again.
+
+Finished results are kept in a cache counted against the memory budget, and the
+server and the workers each enforce an equal share of that budget.
+"""
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from aggregates import AggregationEngine, LRUCache
+from approximate import StratifiedSample
+from dataset_store import DatasetStore
+from incremental import Derived, build_cube, build_language_index, update_cube
+from language_index import language_analytics
+from memory_budget import budget
+from scatter_lod import bin_points
+
+WORKERS_ENV = 'DATA_EXPLORER_WORKERS'
+MAX_RESULTS = 256
+# Datasets (versions or year partitions) each worker keeps mapped at once
+MAX_STATES = 8
+
+# --- WORKER SIDE ---
+# Per worker process: the mapped datasets and the structures built on them, by cache file.
+_worker_state = LRUCache(MAX_STATES)
+_language_indexes = Derived(build_language_index, budget=budget, name='language index')
+
+
+def _init_worker(limit):
+    budget.limit = limit
+
+
+def _state(cache_path, version):
+    state = _worker_state.get(cache_path)
+    if state is None:
+        store = DatasetStore.from_cache(cache_path, version)
+        state = _worker_state.put(cache_path, {'store': store, 'engine': AggregationEngine(version, store.frame)})
+    return state
+
+
+def compute_language_analytics(cache_path, version, filters, top_n):
+    state = _state(cache_path, version)
+    rows = state['engine'].rows(filters)
+    return language_analytics(_language_indexes.get(state['store']), state['store'].column('ConvertedCompYearly'),
+                              rows, top_n)
+
+
+def compute_cube(cache_path, version, previous=None):
+    """Builds the cube, or updates previous = (cache path, version, cube) of the parent version."""
+    store = _state(cache_path, version)['store']
+    if previous is not None and store.delta is not None and store.delta.parent == previous[1]:
+        return update_cube(previous[2], DatasetStore.from_cache(previous[0], previous[1]), store)
+    return build_cube(store, _language_indexes.get(store))
+
+
+def compute_scatter_bins(cache_path, version, filters, x_range, y_range):
+    state = _state(cache_path, version)
+    frame = state['store'].frame(['YearsCode', 'ConvertedCompYearly', 'DevType'], rows=state['engine'].rows(filters))
+    return bin_points(frame, 'YearsCode', 'ConvertedCompYearly', 'DevType', x_range, y_range)
+
+
+def compute_row_count(cache_path, version, filters):
+    state = _state(cache_path, version)
+    rows = state['engine'].rows(filters)
+    return state['store'].num_rows if rows is None else len(rows)
+
+
+def compute_sample(cache_path, version):
+    return StratifiedSample(_state(cache_path, version)['store'])
+
+
+# Artifacts the pool can compute, by name.
+TASKS = {
+    'language_analytics': compute_language_analytics,
+    'cube': compute_cube,
+    'scatter_bins': compute_scatter_bins,
+    'row_count': compute_row_count,
+    'sample': compute_sample,
+}
+# Artifacts whose task accepts the previous version's result to update.
+INCREMENTAL_TASKS = {'cube'}
+
+
+# --- SERVER SIDE ---
+class BackgroundTasks:
+    """Submits artifacts to a process pool and serves the latest result per artifact name and dataset."""
+
+    def __init__(self, max_workers=None):
+        max_workers = max_workers or int(os.environ.get(WORKERS_ENV, 0)) or os.cpu_count()
+        # Each worker keeps caches of its own, so the server and the workers split the budget
+        limit = budget.share(max_workers + 1)
+        # Spawned workers import only the data modules, never the Streamlit script.
+        self.executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context('spawn'),
+                                            initializer=_init_worker, initargs=(limit,))
+        # Computations in flight; a finished one moves its result to the latest results
+        self._futures = {}
+        # Latest finished result per (artifact name, year, arguments), as (cache path, version,
+        # result); the year is None for a whole dataset. Only the same request for an older
+        # version is served while a fresh one computes, never another filter set's result
+        self._latest = LRUCache(MAX_RESULTS, budget=budget, name='background results')
+        # Newest version requested per year
+        self._versions = {}
+        # Reentrant: a future that is already done runs its callback as it is added
+        self._lock = threading.RLock()
+
+    def _future(self, store, name, args):
+        with self._lock:
+            self._versions[store.year] = store.version
+            key = ((store.cache_path, store.version), name, args)
+            future = self._futures.get(key)
+            if future is None:
+                latest = self._latest.get((name, store.year, args))
+                if latest is not None and latest[:2] == key[0]:
+                    # Already computed for this version
+                    future = Future()
+                    future.set_result(latest[2])
+                    return key, future
+                kwargs = {}
+                if name in INCREMENTAL_TASKS and not args and latest is not None and latest[1] != store.version:
+                    kwargs['previous'] = latest
+                future = self.executor.submit(TASKS[name], store.cache_path, store.version, *args, **kwargs)
+                self._futures[key] = future
+                future.add_done_callback(lambda future: self._done(store, key, future))
+        return key, future
+
+    def submit(self, store, name, *args):
+        """Starts computing an artifact of the store if it is not already computed or in flight."""
+        self._future(store, name, args)
+
+    def fetch(self, store, name, *args):
+        """Returns (result, is_fresh): the requested result if finished, else the latest one for the
+        same request on an older version, or None."""
+        key, future = self._future(store, name, args)
+        if future.done():
+            return future.result(), True
+        latest = self._latest.get((name, store.year, args))
+        return None if latest is None else latest[2], False
+
+    def wait(self, store, name, *args):
+        """Blocks until the requested artifact is ready and returns it."""
+        return self._future(store, name, args)[1].result()
+
+    def _done(self, store, key, future):
+        """Moves a finished computation's result to the latest results; failed ones are forgotten."""
+        dataset, name = key[0], key[1]
+        with self._lock:
+            self._futures.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            # A late result for an older version must not replace the current version's
+            latest = self._latest.get((name, store.year, key[2]))
+            current = self._versions.get(store.year)
+            if latest is None or dataset[1] == current or latest[1] != current:
+                self._latest.put((name, store.year, key[2]), dataset + (future.result(),))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
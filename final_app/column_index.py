@@ -0,0 +1,93 @@
+"""Column profiles and bitmap indexes behind the Data Explorer filter panel.
+
+Numeric columns are profiled with their range and a histogram and filtered through
+their pre-sorted index; categorical columns are profiled with their value counts and
+filtered through one packed bitmap per value. Every predicate becomes a bitmap, so a
+combination of filters is a bitwise AND over n/8 bytes.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from aggregates import LRUCache
+from memory_budget import budget
+
+HISTOGRAM_BINS = 30
+# Bitmaps and sorted column copies held at once, across columns
+MAX_ENTRIES = 256
+
+NumericProfile = namedtuple('NumericProfile', 'min max counts edges')
+CategoricalProfile = namedtuple('CategoricalProfile', 'values counts')
+
+
+def to_rows(bitmap, num_rows):
+    """Row positions whose bit is set in a packed bitmap."""
+    return np.flatnonzero(np.unpackbits(bitmap, count=num_rows))
+
+
+def contains(bitmap, rows):
+    """Boolean array saying which of the given row positions are set in a packed bitmap."""
+    return ((bitmap[rows >> 3] >> (7 - (rows & 7)).astype(np.uint8)) & 1) == 1
+
+
+class ColumnIndex:
+    """Per-column profiles plus lazily built, cached bitmaps and sorted column copies for filter predicates."""
+
+    def __init__(self, store, numeric_columns, categorical_columns, bins=HISTOGRAM_BINS):
+        self.store = store
+        self.num_rows = store.num_rows
+        self.profiles = {}
+        for column in numeric_columns:
+            values = store.column(column).to_numpy(dtype=np.float64)
+            counts, edges = np.histogram(values, bins=bins) if len(values) else (np.array([]), np.array([0, 0]))
+            self.profiles[column] = NumericProfile(edges[0], edges[-1], counts, edges)
+        for column in categorical_columns:
+            counts = store.column(column).value_counts(sort=False)
+            counts = counts[counts > 0]
+            counts = counts.iloc[np.argsort(counts.index.astype(str))]
+            self.profiles[column] = CategoricalProfile(counts.index.tolist(), counts.to_numpy())
+        self._cache = LRUCache(MAX_ENTRIES, budget=budget, name='filters')
+
+    def _cached(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache.put(key, compute())
+        return value
+
+    def value_bitmap(self, column, value):
+        """Bitmap of the rows where a categorical column equals one value."""
+        def compute():
+            series = self.store.column(column)
+            code = series.cat.categories.get_loc(value)
+            return np.packbits(series.cat.codes.to_numpy() == code)
+        return self._cached(('value', column, value), compute)
+
+    def range_bitmap(self, column, low, high):
+        """Bitmap of the rows where a numeric column lies in [low, high], found on its sorted index."""
+        def compute():
+            order, _ = self.store.sort_index(column)
+            sorted_values = self._cached(('sorted', column), lambda: self.store.column(column).to_numpy()[order])
+            start = np.searchsorted(sorted_values, low, side='left')
+            stop = np.searchsorted(sorted_values, high, side='right')
+            selected = np.zeros(self.num_rows, dtype=bool)
+            selected[order[start:stop]] = True
+            return np.packbits(selected)
+        return self._cached(('range', column, low, high), compute)
+
+    def select(self, categories=None, ranges=None):
+        """ANDs the bitmaps of a filter set; returns None when nothing is filtered.
+
+        ``categories`` maps a column to the values to keep (OR within a column) and
+        ``ranges`` maps a column to an inclusive (low, high) pair.
+        """
+        bitmaps = []
+        for column, values in (categories or {}).items():
+            if values:
+                bitmaps.append(np.bitwise_or.reduce([self.value_bitmap(column, value) for value in values]))
+        for column, (low, high) in (ranges or {}).items():
+            profile = self.profiles[column]
+            if low > profile.min or high < profile.max:
+                bitmaps.append(self.range_bitmap(column, low, high))
+        if not bitmaps:
+            return None
+        return np.bitwise_and.reduce(bitmaps)
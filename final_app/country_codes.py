@@ -0,0 +1,85 @@
+"""Country name -> ISO alpha-3 resolution for the Global Insights maps.
+
+Each distinct survey country name is resolved once, first through the override file
+(for the survey's non-standard names) and then through pycountry_convert, and the
+resulting table is persisted next to the data cache. Maps then look codes up per
+category instead of calling a converter per row. One table is shared by every session,
+so updates and lookups are serialised on a lock.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from pycountry_convert import country_name_to_country_alpha3
+
+OVERRIDES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'country_overrides.csv')
+
+
+def _normalise_name(name):
+    return ' '.join(str(name).split()).casefold()
+
+
+def load_overrides(path=OVERRIDES_PATH):
+    """Reads the override file as a {normalised name: ISO alpha-3} dict."""
+    if not os.path.exists(path):
+        return {}
+    overrides = pd.read_csv(path, dtype=str).dropna()
+    return dict(zip(overrides['Country'].map(_normalise_name), overrides['iso_alpha'].str.upper()))
+
+
+def resolve_country(name, overrides):
+    """Resolves one country name, returning None when it cannot be mapped."""
+    code = overrides.get(_normalise_name(name))
+    if code is not None:
+        return code
+    try:
+        return country_name_to_country_alpha3(name)
+    except KeyError:
+        return None
+
+
+class CountryCodeTable:
+    """Persisted Country -> iso_alpha table covering every name seen so far."""
+
+    def __init__(self, cache_dir, overrides_path=OVERRIDES_PATH):
+        self.overrides = load_overrides(overrides_path)
+        # Changing the override file gives the table a new name, so it is rebuilt.
+        digest = hashlib.sha1(repr(sorted(self.overrides.items())).encode()).hexdigest()[:16]
+        self.path = os.path.join(cache_dir, f"country-iso-{digest}.csv")
+        if os.path.exists(self.path):
+            table = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            self.codes = dict(zip(table['Country'], table['iso_alpha'].replace('', None)))
+        else:
+            self.codes = {}
+        self._lock = threading.Lock()
+
+    def update(self, countries):
+        """Resolves any names not already in the table and persists the result."""
+        with self._lock:
+            missing = [name for name in pd.unique(np.asarray(countries, dtype=object)) if name not in self.codes]
+            if not missing:
+                return self
+            for name in missing:
+                self.codes[name] = resolve_country(name, self.overrides)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            table = pd.DataFrame({'Country': list(self.codes), 'iso_alpha': [code or '' for code in self.codes.values()]})
+            # Other server processes may be writing the same table; each writes its own temporary file
+            handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(handle, 'w', newline='') as tmp_file:
+                table.to_csv(tmp_file, index=False)
+            os.replace(tmp_path, self.path)
+        return self
+
+    def lookup(self, countries):
+        """ISO alpha-3 codes for a categorical Country column, via one lookup per category."""
+        countries = countries.astype('category')
+        categories = countries.cat.categories
+        self.update(categories)
+        with self._lock:
+            codes = pd.Series(self.codes, dtype=object)
+        category_codes = np.append(codes.reindex(categories).to_numpy(), None)
+        # Missing values have category code -1, which picks the trailing None.
+        return pd.Series(category_codes[countries.cat.codes.to_numpy()], index=countries.index, name='iso_alpha')
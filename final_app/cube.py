@@ -0,0 +1,211 @@
+"""Pre-aggregated compensation cube over Country x DevType x experience band (x language).
+
+Every cell stores its respondent count, salary sum and a log-bucket quantile sketch
+of ConvertedCompYearly. Bucket i covers (gamma^(i-1), gamma^i], so any quantile read
+from merged sketches is within RELATIVE_ACCURACY of the true value, and merging cells
+is just adding bucket counts. Roll-ups under any filter combination therefore touch
+cells and sketch entries, never respondent rows.
+
+The language cube has one entry per (respondent, language) pair, so filtering it on
+several languages counts a respondent once for each matching language.
+
+Counts, sums and sketches are all additive, so a new dataset version's cube is the
+previous cube minus the removed rows' contributions plus the appended rows'.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from memory_budget import nbytes
+
+RELATIVE_ACCURACY = 0.005
+# Lower bounds of the YearsCode bands; the last band is open-ended.
+EXPERIENCE_BANDS = [0, 2, 5, 10, 20, 30]
+EXPERIENCE_LABELS = ['0-1 years', '2-4 years', '5-9 years', '10-19 years', '20-29 years', '30+ years']
+
+
+def _radix_keys(columns, sizes):
+    """Packs per-row dimension codes into one int64 key (mixed radix)."""
+    keys = np.zeros(len(columns[0]) if columns else 0, dtype=np.int64)
+    for codes, size in zip(columns, sizes):
+        keys = keys * size + codes
+    return keys
+
+
+def _radix_codes(keys, sizes):
+    """Unpacks mixed-radix keys into per-dimension codes, in the order they were packed."""
+    codes = []
+    for size in reversed(sizes):
+        keys, code = np.divmod(keys, size)
+        codes.append(code)
+    return codes[::-1]
+
+
+class CubeTable:
+    """Cells keyed by dimension codes, plus the sparse (cell, bucket, count) sketch entries."""
+
+    def __init__(self, names, sizes, keys, count, total, entry_keys, entry_buckets, entry_count, num_buckets):
+        """Sums weighted rows (or cells) into cells and sketch entries.
+
+        ``keys`` are mixed-radix cell keys over ``sizes`` with their count and salary sum
+        weights; sketch entries are given separately as (cell key, bucket, count). Cells and
+        entries whose counts sum to zero are dropped.
+        """
+        self.names = names
+        self.sizes = sizes
+        cell_keys, cell_of_row = np.unique(keys, return_inverse=True)
+        count = np.bincount(cell_of_row, weights=count, minlength=len(cell_keys))
+        total = np.bincount(cell_of_row, weights=total, minlength=len(cell_keys))
+        live = count != 0
+        self.keys = cell_keys[live]
+        self.cells = pd.DataFrame(dict(zip(names, _radix_codes(self.keys, sizes))))
+        self.cells['Count'] = np.rint(count[live]).astype(np.int64)
+        self.cells['Sum'] = total[live]
+
+        entry_keys, entry_of_row = np.unique(entry_keys * num_buckets + entry_buckets, return_inverse=True)
+        entry_count = np.rint(np.bincount(entry_of_row, weights=entry_count, minlength=len(entry_keys))).astype(np.int64)
+        live = entry_count != 0
+        cell_keys, self.entry_bucket = np.divmod(entry_keys[live], num_buckets)
+        self.entry_cell = np.searchsorted(self.keys, cell_keys)
+        self.entry_count = entry_count[live]
+
+    @property
+    def nbytes(self):
+        return nbytes([self.keys, self.cells, self.entry_bucket, self.entry_cell, self.entry_count])
+
+    @classmethod
+    def from_rows(cls, dimensions, sizes, salary, buckets, num_buckets, weights):
+        """Aggregates rows given as per-dimension codes, each counted with its weight."""
+        names = list(dimensions)
+        sizes = [sizes[name] for name in names]
+        keys = _radix_keys([dimensions[name] for name in names], sizes)
+        return cls(names, sizes, keys, weights, salary * weights, keys, buckets, weights, num_buckets)
+
+    def merged(self, other, sizes, num_buckets):
+        """This table plus another over the same dimensions, whose sizes may have grown since."""
+        sizes = [sizes[name] for name in self.names]
+        keys = [_radix_keys(_radix_codes(table.keys, table.sizes), sizes) for table in (self, other)]
+        return CubeTable(
+            self.names, sizes,
+            np.concatenate(keys),
+            np.concatenate([self.cells['Count'], other.cells['Count']]),
+            np.concatenate([self.cells['Sum'], other.cells['Sum']]),
+            np.concatenate([keys[0][self.entry_cell], keys[1][other.entry_cell]]),
+            np.concatenate([self.entry_bucket, other.entry_bucket]),
+            np.concatenate([self.entry_count, other.entry_count]),
+            num_buckets,
+        )
+
+
+class CompensationCube:
+    """Materialised counts, sums and salary sketches, rolled up on demand."""
+
+    def __init__(self, frame, language_index=None, relative_accuracy=RELATIVE_ACCURACY):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.relative_accuracy = relative_accuracy
+        self.num_buckets = 1
+        self.tables = self._tables(frame, language_index)
+
+    @property
+    def nbytes(self):
+        return nbytes(self.tables)
+
+    def _tables(self, frame, language_index, weight=1.0):
+        """Tables over the frame's rows counted with the given weight; sets the labels from its categories."""
+        salary = frame['ConvertedCompYearly'].to_numpy(dtype=np.float64)
+        buckets = self.bucket(salary)
+        self.num_buckets = max(self.num_buckets, int(buckets.max()) + 1 if len(buckets) else 1)
+        weights = np.full(len(salary), weight)
+
+        band = np.digitize(frame['YearsCode'].to_numpy(), EXPERIENCE_BANDS[1:])
+        dimensions = {
+            'Country': frame['Country'].cat.codes.to_numpy(dtype=np.int64),
+            'DevType': frame['DevType'].cat.codes.to_numpy(dtype=np.int64),
+            'ExperienceBand': band.astype(np.int64),
+        }
+        self.labels = {
+            'Country': np.asarray(frame['Country'].cat.categories, dtype=object),
+            'DevType': np.asarray(frame['DevType'].cat.categories, dtype=object),
+            'ExperienceBand': np.asarray(EXPERIENCE_LABELS, dtype=object),
+        }
+        sizes = {name: len(labels) for name, labels in self.labels.items()}
+        tables = {'base': CubeTable.from_rows(dimensions, sizes, salary, buckets, self.num_buckets, weights)}
+
+        if language_index is not None:
+            respondents = language_index.respondents
+            pair_dimensions = {name: codes[respondents] for name, codes in dimensions.items()}
+            pair_dimensions['Language'] = language_index.codes.astype(np.int64)
+            self.labels['Language'] = language_index.vocabulary
+            sizes['Language'] = len(language_index.vocabulary)
+            tables['language'] = CubeTable.from_rows(pair_dimensions, sizes, salary[respondents],
+                                                     buckets[respondents], self.num_buckets, weights[respondents])
+        return tables
+
+    def updated(self, removed, removed_languages, added, added_languages):
+        """A new cube with the removed rows subtracted and the added rows added.
+
+        Removed rows come from the previous dataset version and added rows from the new
+        one, whose categories and language vocabulary extend the previous version's.
+        """
+        cube = copy.copy(self)
+        removals = cube._tables(removed, removed_languages, weight=-1.0)
+        additions = cube._tables(added, added_languages)
+        sizes = {name: len(labels) for name, labels in cube.labels.items()}
+        cube.tables = {name: table.merged(removals[name], sizes, cube.num_buckets)
+                                  .merged(additions[name], sizes, cube.num_buckets)
+                       for name, table in self.tables.items()}
+        return cube
+
+    def bucket(self, values):
+        """Sketch bucket of each value; values below 1 share bucket 0."""
+        return np.ceil(np.log(np.maximum(values, 1.0)) / np.log(self.gamma)).astype(np.int64)
+
+    def bucket_value(self, buckets):
+        """Representative value of a bucket, within the relative accuracy of any value in it."""
+        return 2 * self.gamma ** buckets / (self.gamma + 1)
+
+    def values(self, dimension):
+        return list(self.labels[dimension])
+
+    def rollup(self, by, filters=None, quantiles=(0.5,)):
+        """Count, sum, mean and salary quantiles grouped by the given dimensions.
+
+        ``filters`` maps a dimension to the labels to keep; empty selections are ignored.
+        """
+        filters = {name: values for name, values in (filters or {}).items() if values}
+        by = list(by)
+        table = self.tables['language' if 'Language' in by or 'Language' in filters else 'base']
+        cells = table.cells
+
+        keep = np.ones(len(cells), dtype=bool)
+        for name, values in filters.items():
+            wanted = pd.Index(self.labels[name]).get_indexer(list(values))
+            keep &= np.isin(cells[name].to_numpy(), wanted[wanted >= 0])
+
+        sizes = [len(self.labels[name]) for name in by]
+        group_keys, group_of_cell = np.unique(_radix_keys([cells[name].to_numpy()[keep] for name in by], sizes),
+                                              return_inverse=True)
+        groups = len(group_keys)
+        cell_group = np.full(len(cells), -1, dtype=np.int64)
+        cell_group[keep] = group_of_cell
+
+        result = pd.DataFrame({name: self.labels[name][codes] for name, codes in zip(by, _radix_codes(group_keys, sizes))})
+        result['Count'] = np.bincount(group_of_cell, weights=cells['Count'].to_numpy()[keep], minlength=groups).astype(np.int64)
+        result['Sum'] = np.bincount(group_of_cell, weights=cells['Sum'].to_numpy()[keep], minlength=groups)
+        result['Mean'] = result['Sum'] / result['Count']
+
+        # Merge the kept cells' sketches per group, then read quantiles off the cumulative counts
+        entry_group = cell_group[table.entry_cell]
+        used = entry_group >= 0
+        histogram = np.bincount(entry_group[used] * self.num_buckets + table.entry_bucket[used],
+                                weights=table.entry_count[used], minlength=groups * self.num_buckets)
+        cumulative = np.cumsum(histogram.reshape(groups, self.num_buckets), axis=1)
+        totals = result['Count'].to_numpy()
+        for q in quantiles:
+            # Linear interpolation between the neighbouring order statistics, as pandas does
+            position = q * (totals - 1)
+            lower = self.bucket_value(np.argmax(cumulative > np.floor(position)[:, None], axis=1))
+            upper = self.bucket_value(np.argmax(cumulative > np.ceil(position)[:, None], axis=1))
+            result[q] = lower + (upper - lower) * (position - np.floor(position))
+        return result
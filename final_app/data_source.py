@@ -0,0 +1,515 @@
+"""Data-source layer for the IT Industry Data Explorer.
+
+A source is the embedded sample CSV or a CSV, Parquet or Arrow IPC file on disk.
+On first read every source is streamed in bounded chunks, cleaned, typed and
+appended to an Arrow IPC cache file, so peak memory stays near one chunk; later
+reads memory-map that file and only materialise the requested columns.
+
+In the cache, Country and DevType are dictionary-encoded, and every respondent's
+language list is also stored pre-split as LanguageCodes: a list column whose values
+index one dictionary of languages, i.e. a ragged array of offsets and integer codes.
+
+A source may also be a directory of yearly exports (survey_2022.csv, survey_2023.parquet,
+...). Each file is a partition with its own cache, so adding a year only ingests that
+year; partitions whose cache is missing are ingested concurrently in a process pool.
+Column names and language spellings that changed between survey years are aligned
+at ingest.
+"""
+import csv
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from country_codes import load_overrides, resolve_country
+
+# Environment variables used to point the app at a real survey extract.
+SOURCE_ENV = 'DATA_EXPLORER_SOURCE'
+CACHE_DIR_ENV = 'DATA_EXPLORER_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+# Bump when the cleaning rules or column types change so stale caches are rebuilt.
+CACHE_FORMAT = 5
+CHUNK_ROWS = 100_000
+
+COLUMNS = ['ResponseId', 'EmployeeName', 'YearsCode', 'DevType', 'Country',
+           'LanguageHaveWorkedWith', 'ConvertedCompYearly']
+COLUMN_TYPES = {
+    'ResponseId': 'int64',
+    'YearsCode': 'int32',
+    'ConvertedCompYearly': 'float64',
+    'Country': 'category',
+    'DevType': 'category',
+}
+CATEGORICAL_COLUMNS = [column for column, dtype in COLUMN_TYPES.items() if dtype == 'category']
+SCHEMA = pa.schema([
+    ('ResponseId', pa.int64()),
+    ('EmployeeName', pa.string()),
+    ('YearsCode', pa.int32()),
+    ('DevType', pa.dictionary(pa.int32(), pa.string())),
+    ('Country', pa.dictionary(pa.int32(), pa.string())),
+    ('LanguageHaveWorkedWith', pa.string()),
+    ('ConvertedCompYearly', pa.float64()),
+    ('LanguageCodes', pa.list_(pa.dictionary(pa.int32(), pa.string()))),
+])
+# Derived list columns: name -> (source column, separator)
+RAGGED_COLUMNS = {'LanguageCodes': ('LanguageHaveWorkedWith', ';')}
+# Column names used by other survey years, mapped to the app's names.
+COLUMN_ALIASES = {
+    'YearsCodePro': 'YearsCode',
+    'Respondent': 'ResponseId',
+    'ConvertedComp': 'ConvertedCompYearly',
+    'LanguageWorkedWith': 'LanguageHaveWorkedWith',
+}
+# Text answers of the experience questions, as numbers.
+YEARS_TEXT = {'Less than 1 year': '0', 'More than 50 years': '50'}
+# Language spellings used by other survey years, mapped to the latest ones.
+LANGUAGE_ALIASES = {
+    'Bash/Shell': 'Bash/Shell (all shells)',
+    'Bash/Shell/PowerShell': 'Bash/Shell (all shells)',
+    'HTML': 'HTML/CSS',
+    'CSS': 'HTML/CSS',
+    'Delphi/Object Pascal': 'Delphi',
+    'Objective C': 'Objective-C',
+    'VB.NET': 'Visual Basic (.Net)',
+    'Visual Basic 6': 'Visual Basic (.Net)',
+    'Other(s):': 'Other',
+}
+# Four-digit year in a partition's file name.
+YEAR_PATTERN = re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)')
+
+# Why a row is dropped, checked in this order; each row is counted under its first reason.
+DROP_REASONS = [
+    ('missing or non-numeric ResponseId', 'ResponseId'),
+    ('missing or non-numeric ConvertedCompYearly', 'ConvertedCompYearly'),
+    ('missing or non-numeric YearsCode', 'YearsCode'),
+    ('missing Country', 'Country'),
+    ('missing LanguageHaveWorkedWith', 'LanguageHaveWorkedWith'),
+    ('missing DevType', 'DevType'),
+]
+NUMERIC_COLUMNS = ['ResponseId', 'ConvertedCompYearly', 'YearsCode']
+
+
+class IngestStats:
+    """Row accounting for one ingestion run."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rows_repaired = 0
+        self.dropped = {}
+
+    def drop(self, reason, count):
+        if count:
+            self.dropped[reason] = self.dropped.get(reason, 0) + int(count)
+
+    def to_dict(self):
+        return {'rows_read': self.rows_read, 'rows_written': self.rows_written,
+                'rows_repaired': self.rows_repaired, 'dropped': self.dropped}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.rows_read = data['rows_read']
+        stats.rows_written = data['rows_written']
+        stats.rows_repaired = data['rows_repaired']
+        stats.dropped = dict(data['dropped'])
+        return stats
+
+
+# --- RAW READERS ---
+# Each reader yields raw DataFrame chunks of at most chunk_rows rows, and reports
+# progress as the fraction of the input consumed so far.
+def repair_row(row, header, devtype_field):
+    """Re-joins a DevType value that was split on its unquoted commas.
+
+    Returns None when the surplus fields cannot be attributed to DevType: after the
+    merge, the numeric fields must still parse and the Country must be a known country,
+    so commas in a name or a country name are not silently shifted into other columns.
+    """
+    if len(row) <= len(header):
+        return row
+    tail = len(row) - (len(header) - devtype_field - 1)
+    row = row[:devtype_field] + [','.join(row[devtype_field:tail])] + row[tail:]
+    return row if _plausible(dict(zip([COLUMN_ALIASES.get(name, name) for name in header], row))) else None
+
+
+def _plausible(fields):
+    for column in NUMERIC_COLUMNS:
+        value = fields.get(column, '').strip()
+        if column == 'YearsCode':
+            value = YEARS_TEXT.get(value, value)
+        if value:
+            try:
+                float(value)
+            except ValueError:
+                return False
+    country = fields.get('Country', '')
+    return not country or _known_country(country)
+
+
+@functools.lru_cache(maxsize=None)
+def _known_country(name):
+    return resolve_country(name, _overrides()) is not None
+
+
+@functools.lru_cache(maxsize=1)
+def _overrides():
+    return load_overrides()
+
+
+def _counted_lines(handle, total, progress):
+    consumed = 0
+    for line in handle:
+        consumed += len(line)
+        yield line
+        if progress is not None and consumed % 1_048_576 < len(line):
+            progress(consumed / total if total else 1.0)
+
+
+def iter_csv_text(handle, total, chunk_rows, stats, progress=None):
+    """Streams a survey CSV in chunks, repairing rows whose DevType contains unquoted commas."""
+    reader = csv.reader(_counted_lines(handle, total, progress))
+    header = next(reader)
+    width = len(header)
+    devtype_field = header.index('DevType') if 'DevType' in header else None
+    chunk = []
+    for row in reader:
+        if not row:
+            continue
+        stats.rows_read += 1
+        if len(row) > width and devtype_field is not None:
+            row = repair_row(row, header, devtype_field)
+            if row is None:
+                stats.drop('malformed row', 1)
+                continue
+            stats.rows_repaired += 1
+        if len(row) != width:
+            stats.drop('wrong number of fields', 1)
+            continue
+        chunk.append(row)
+        if len(chunk) == chunk_rows:
+            yield pd.DataFrame(chunk, columns=header)
+            chunk = []
+    if chunk:
+        yield pd.DataFrame(chunk, columns=header)
+
+
+def read_csv(path, chunk_rows, stats, progress=None):
+    with open(path, newline='', encoding='utf-8') as handle:
+        yield from iter_csv_text(handle, os.path.getsize(path), chunk_rows, stats, progress)
+
+
+def _iter_batches(batches, num_rows, stats, progress):
+    for batch in batches:
+        stats.rows_read += batch.num_rows
+        if progress is not None:
+            progress(stats.rows_read / num_rows if num_rows else 1.0)
+        yield batch.to_pandas()
+
+
+def read_parquet(path, chunk_rows, stats, progress=None):
+    parquet = pq.ParquetFile(path, memory_map=True)
+    yield from _iter_batches(parquet.iter_batches(batch_size=chunk_rows), parquet.metadata.num_rows, stats, progress)
+
+
+def read_arrow(path, chunk_rows, stats, progress=None):
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        batches = (reader.get_batch(i).slice(offset, chunk_rows) for i in range(reader.num_record_batches)
+                   for offset in range(0, reader.get_batch(i).num_rows, chunk_rows))
+        yield from _iter_batches(batches, num_rows, stats, progress)
+
+
+# Raw readers by file extension; register new formats here.
+READERS = {
+    '.csv': read_csv,
+    '.parquet': read_parquet,
+    '.pq': read_parquet,
+    '.arrow': read_arrow,
+    '.feather': read_arrow,
+    '.ipc': read_arrow,
+}
+
+
+# --- CLEANING ---
+def normalise(df, stats=None):
+    """Applies the app's column names, types and missing-value rules to a raw chunk."""
+    # Where a file has both an alias and the app's column, the alias is the one the app means
+    df = df.drop(columns=[new for old, new in COLUMN_ALIASES.items() if old in df.columns and new in df.columns])
+    df = df.rename(columns=COLUMN_ALIASES)
+    if 'YearsCode' in df.columns:
+        df['YearsCode'] = df['YearsCode'].replace(YEARS_TEXT)
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in CATEGORICAL_COLUMNS + ['EmployeeName', 'LanguageHaveWorkedWith']:
+        if column in df.columns:
+            df[column] = df[column].replace('', None)
+    keep = np.ones(len(df), dtype=bool)
+    for reason, column in DROP_REASONS:
+        missing = keep & df[column].isna().to_numpy()
+        if stats is not None:
+            stats.drop(reason, missing.sum())
+        keep &= ~missing
+    df = df[keep]
+    df = df[[column for column in COLUMNS if column in df.columns]]
+    return df.astype({column: dtype for column, dtype in COLUMN_TYPES.items()
+                      if column in df.columns and dtype != 'category'})
+
+
+class DictionaryEncoder:
+    """Encodes a categorical column chunk by chunk against one growing dictionary.
+
+    New values are only ever appended, so each batch's dictionary extends the last one
+    and the IPC writer can store it as a delta.
+    """
+
+    def __init__(self, values=()):
+        self.values = pd.Index(list(values), dtype=object)
+
+    def _extend(self, values):
+        new = pd.Index(values.dropna().unique()).difference(self.values, sort=False)
+        if len(new):
+            self.values = self.values.append(pd.Index(new, dtype=object))
+
+    def _array(self, indices):
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32(), mask=indices < 0), pa.array(self.values, type=pa.string()))
+
+    def encode(self, series):
+        self._extend(series)
+        return self._array(self.values.get_indexer(series))
+
+    def encode_lists(self, series, separator, aliases=None):
+        """Splits each value on separator and encodes the items as a list of dictionary codes.
+
+        Empty items are dropped, so a row's list may be empty; items found in aliases
+        are encoded as the value they map to.
+        """
+        split = pc.split_pattern(pa.array(series, type=pa.string(), from_pandas=True), separator)
+        lengths = pc.list_value_length(split).fill_null(0).to_numpy(zero_copy_only=False)
+        # Items are hashed by Arrow against a chunk-local dictionary; only its few distinct
+        # values are looked up in the shared one
+        items = pc.list_flatten(split).dictionary_encode()
+        distinct = pd.Series(items.dictionary.to_pylist(), dtype=object)
+        if aliases:
+            distinct = distinct.replace(aliases)
+        self._extend(distinct[distinct != ''])
+        local = items.indices.to_numpy(zero_copy_only=False)
+        keep = (distinct != '').to_numpy()[local]
+        owners = np.repeat(np.arange(len(lengths)), lengths)[keep]
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(owners, minlength=len(lengths)), out=offsets[1:])
+        codes = self.values.get_indexer(distinct)[local[keep]]
+        return pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), self._array(codes))
+
+
+def to_record_batch(df, encoders):
+    """Converts a normalised chunk to a record batch with the cache schema."""
+    arrays = []
+    for field in SCHEMA:
+        if field.name in RAGGED_COLUMNS:
+            column, separator = RAGGED_COLUMNS[field.name]
+            arrays.append(encoders[field.name].encode_lists(df[column], separator, LANGUAGE_ALIASES))
+        elif field.name in encoders:
+            arrays.append(encoders[field.name].encode(df[field.name]))
+        else:
+            arrays.append(pa.array(df[field.name], type=field.type, from_pandas=True))
+    return pa.record_batch(arrays, schema=SCHEMA)
+
+
+# --- SOURCES ---
+class DataSource:
+    """A survey dataset backed by a memory-mapped, typed Arrow IPC cache file."""
+
+    def __init__(self, path=None, text=None, cache_dir=None, chunk_rows=CHUNK_ROWS):
+        if path is None and text is None:
+            raise ValueError("A data source needs either a file path or embedded CSV text.")
+        if path is not None:
+            self.extension = os.path.splitext(path)[1].lower()
+            if self.extension not in READERS:
+                raise ValueError(f"Unsupported data file type '{self.extension}' for {path}.")
+        self.path = path
+        self.text = text
+        self.chunk_rows = chunk_rows
+        self.cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.version = self._fingerprint()
+        self.cache_path = os.path.join(self.cache_dir, f"survey-{self.version}.arrow")
+        self.report_path = os.path.join(self.cache_dir, f"survey-{self.version}.json")
+        self._build_lock = threading.Lock()
+
+    def _fingerprint(self):
+        digest = hashlib.sha1(f"format={CACHE_FORMAT}".encode())
+        if self.path is not None:
+            stat = os.stat(self.path)
+            digest.update(f"{os.path.abspath(self.path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        else:
+            digest.update(self.text.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _iter_raw(self, stats, progress):
+        if self.path is None:
+            return iter_csv_text(io.StringIO(self.text), len(self.text), self.chunk_rows, stats, progress)
+        return READERS[self.extension](self.path, self.chunk_rows, stats, progress)
+
+    @property
+    def is_cached(self):
+        return os.path.exists(self.cache_path)
+
+    def build_cache(self, progress=None):
+        """Streams the source into the typed columnar cache if it is not there yet.
+
+        ``progress`` is called with the fraction of the input read and the running
+        IngestStats. Returns the IngestStats of the run that built the cache.
+        """
+        with self._build_lock:
+            if self.is_cached:
+                return self.ingest_report()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            stats = IngestStats()
+            encoders = {column: DictionaryEncoder() for column in CATEGORICAL_COLUMNS + list(RAGGED_COLUMNS)}
+            report = None if progress is None else (lambda fraction: progress(fraction, stats))
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, SCHEMA, options=options) as writer:
+                for chunk in self._iter_raw(stats, report):
+                    chunk = normalise(chunk, stats)
+                    if len(chunk):
+                        writer.write_batch(to_record_batch(chunk, encoders))
+                        stats.rows_written += len(chunk)
+            with open(self.report_path, 'w') as handle:
+                json.dump(stats.to_dict(), handle)
+            os.replace(tmp_path, self.cache_path)
+            if progress is not None:
+                progress(1.0, stats)
+            return stats
+
+    def ingest_report(self):
+        """IngestStats recorded when the cache was built, if available."""
+        if not os.path.exists(self.report_path):
+            return None
+        with open(self.report_path) as handle:
+            return IngestStats.from_dict(json.load(handle))
+
+    def table(self, columns=None):
+        """Returns the cached data as a zero-copy Arrow table."""
+        self.build_cache()
+        return feather.read_table(self.cache_path, columns=columns, memory_map=True)
+
+    def read(self, columns=None):
+        """Returns the requested columns (all of them by default) as a DataFrame."""
+        return self.table(columns).to_pandas()
+
+    @property
+    def num_rows(self):
+        return self.table().num_rows
+
+    @property
+    def column_names(self):
+        return self.table().column_names
+
+
+def _build_partition(path, cache_dir):
+    """Builds one partition's cache in a worker process; returns its ingest stats as a dict."""
+    return DataSource(path=path, cache_dir=cache_dir).build_cache().to_dict()
+
+
+def year_of(path):
+    """The survey year in a partition's file name."""
+    years = YEAR_PATTERN.findall(os.path.basename(path))
+    if not years:
+        raise ValueError(f"No survey year (e.g. 2023) in the file name {path}.")
+    return int(years[-1])
+
+
+class YearlySource:
+    """A directory of yearly survey files, read as one dataset partitioned by year."""
+
+    def __init__(self, directory, cache_dir=None, chunk_rows=CHUNK_ROWS):
+        self.path = directory
+        self.cache_dir = cache_dir or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.sources = {}
+        for name in sorted(os.listdir(directory)):
+            if os.path.splitext(name)[1].lower() not in READERS:
+                continue
+            path = os.path.join(directory, name)
+            year = year_of(path)
+            if year in self.sources:
+                raise ValueError(f"Two files for {year} in {directory}: {self.sources[year].path} and {path}.")
+            self.sources[year] = DataSource(path=path, cache_dir=self.cache_dir, chunk_rows=chunk_rows)
+        if not self.sources:
+            raise ValueError(f"No survey files in {directory}.")
+        self.sources = dict(sorted(self.sources.items()))
+        digest = hashlib.sha1(';'.join(f"{year}={source.version}" for year, source in self.sources.items()).encode())
+        self.version = digest.hexdigest()[:16]
+        # The manifest lists the partitions' cache files; it is what workers open
+        self.cache_path = os.path.join(self.cache_dir, f"survey-{self.version}.manifest.json")
+
+    @property
+    def is_cached(self):
+        return os.path.exists(self.cache_path)
+
+    def build_cache(self, progress=None):
+        """Builds the missing partition caches in parallel, then writes the manifest.
+
+        ``progress`` is called with the fraction of partitions built and the running
+        IngestStats. Returns the combined IngestStats of all partitions.
+        """
+        missing = [source for source in self.sources.values() if not source.is_cached]
+        if len(missing) == 1:
+            missing[0].build_cache()
+        elif missing:
+            with ProcessPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1),
+                                     mp_context=get_context('spawn')) as pool:
+                futures = [pool.submit(_build_partition, source.path, self.cache_dir) for source in missing]
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()
+                    if progress is not None:
+                        progress(done / len(futures), self.ingest_report())
+        if not self.is_cached:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            manifest = [{'year': year, 'cache_path': source.cache_path, 'version': source.version}
+                        for year, source in self.sources.items()]
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as handle:
+                json.dump(manifest, handle)
+            os.replace(tmp_path, self.cache_path)
+        stats = self.ingest_report()
+        if progress is not None:
+            progress(1.0, stats)
+        return stats
+
+    def ingest_report(self):
+        """IngestStats of all partitions built so far, added up."""
+        stats = IngestStats()
+        for source in self.sources.values():
+            report = source.ingest_report()
+            if report is None:
+                continue
+            stats.rows_read += report.rows_read
+            stats.rows_written += report.rows_written
+            stats.rows_repaired += report.rows_repaired
+            for reason, count in report.dropped.items():
+                stats.drop(reason, count)
+        return stats
+
+
+def open_source(path=None, text=None):
+    """Opens the file or directory of yearly files named by DATA_EXPLORER_SOURCE, falling back to the given path or text."""
+    path = os.environ.get(SOURCE_ENV) or path
+    if path is not None and os.path.isdir(path):
+        return YearlySource(path)
+    return DataSource(path=path, text=text)
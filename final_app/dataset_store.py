@@ -0,0 +1,261 @@
+"""Process-wide, read-only dataset store shared by every Streamlit session.
+
+The store wraps the memory-mapped Arrow cache of one dataset version. Numeric and
+string columns stay backed by the mapped file, so server processes that map the same
+cache (ideally on a tmpfs such as /dev/shm) share those pages instead of each holding
+a copy. Sessions keep row-position selections and ask the store for just those rows.
+
+Strings come back as Arrow-backed pandas strings over the mapped buffers, dictionary
+columns as categoricals whose codes pages group and filter on, and list columns as
+RaggedCodes rather than as Python lists.
+
+A version produced by an incremental upsert carries its Delta from the parent
+version, so structures derived from the parent can be updated instead of rebuilt.
+
+A multi-year dataset is opened from its manifest: each year's cache is mapped as its
+own partition store, and the combined store concatenates their tables without
+copying them, adding a Year column. Pages that look at one year use its partition,
+so nothing built for one year depends on the others.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+class RaggedCodes:
+    """A list column as flat integer codes: row i's items are values[offsets[i]:offsets[i + 1]]."""
+
+    def __init__(self, offsets, values, vocabulary):
+        self.offsets = offsets
+        self.values = values
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.values.nbytes
+
+    @property
+    def respondents(self):
+        """Row of each item, parallel to values."""
+        return np.repeat(np.arange(len(self)), np.diff(self.offsets))
+
+    @property
+    def codes(self):
+        return self.values
+
+    def take(self, rows):
+        """The lists of the given rows, in that order, as new RaggedCodes."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        within = np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)
+        return RaggedCodes(offsets, self.values[np.repeat(starts, lengths) + within], self.vocabulary)
+
+    @classmethod
+    def from_arrow(cls, column):
+        """Converts a chunked list<dictionary> column into codes over one vocabulary, in first-seen order.
+
+        Within one cache file each chunk's dictionary extends the previous one and the
+        codes are used as they are; chunks of other partitions are remapped.
+        """
+        offsets, values = [np.zeros(1, dtype=np.int64)], []
+        vocabulary, dictionary, mapping = pd.Index([], dtype=object), None, None
+        for chunk in column.chunks:
+            chunk_offsets = chunk.offsets.to_numpy().astype(np.int64)
+            items = chunk.values.slice(chunk_offsets[0], chunk_offsets[-1] - chunk_offsets[0])
+            offsets.append(chunk_offsets[1:] - chunk_offsets[0] + offsets[-1][-1])
+            if dictionary is None or not items.dictionary.equals(dictionary):
+                dictionary = items.dictionary
+                names = pd.Index(dictionary.to_pylist(), dtype=object)
+                vocabulary = vocabulary.append(names.difference(vocabulary, sort=False))
+                mapping = vocabulary.get_indexer(names)
+                if np.array_equal(mapping, np.arange(len(mapping))):
+                    mapping = None
+            codes = items.indices.to_numpy(zero_copy_only=False)
+            values.append(codes if mapping is None else mapping[codes])
+        return cls(np.concatenate(offsets), np.concatenate(values).astype(np.int32) if values else
+                   np.zeros(0, dtype=np.int32), np.asarray(vocabulary, dtype=object))
+
+
+class Delta:
+    """How a dataset version differs from its parent: rows removed (by parent position) and rows appended."""
+
+    def __init__(self, parent, removed, added):
+        self.parent = parent
+        self.removed = np.asarray(removed, dtype=np.int64)
+        self.added = int(added)
+
+    def added_rows(self, num_rows):
+        """Row positions of the appended rows, which are always the last ones."""
+        return np.arange(num_rows - self.added, num_rows)
+
+    @staticmethod
+    def path(cache_path):
+        return os.path.splitext(cache_path)[0] + '.delta.npz'
+
+    def save(self, cache_path):
+        np.savez(self.path(cache_path), parent=np.array(self.parent), removed=self.removed, added=np.array(self.added))
+
+    @classmethod
+    def load(cls, cache_path):
+        """The delta stored next to a cache file, or None for a version built straight from its source."""
+        if not os.path.exists(cls.path(cache_path)):
+            return None
+        with np.load(cls.path(cache_path)) as data:
+            return cls(str(data['parent']), data['removed'], int(data['added']))
+
+
+class DatasetStore:
+    """Immutable column store over one dataset version; columns are converted once, on first use."""
+
+    def __init__(self, table, version, cache_path=None, delta=None, year=None):
+        self.version = version
+        self.table = table
+        self.cache_path = cache_path
+        self.delta = delta
+        # The survey year of a partition; None for a whole dataset
+        self.year = year
+        # Per-year partition stores of a multi-year dataset, in year order
+        self.partitions = {}
+        self._columns = {}
+        self._ragged = {}
+        self._sort_orders = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_source(cls, source):
+        source.build_cache()
+        return cls.from_cache(source.cache_path, source.version)
+
+    @classmethod
+    def from_cache(cls, cache_path, version, year=None):
+        """Maps an already built cache file or multi-year manifest, e.g. from a worker process."""
+        if cache_path.endswith(MANIFEST_SUFFIX):
+            with open(cache_path) as handle:
+                manifest = json.load(handle)
+            return cls.combine({entry['year']: cls.from_cache(entry['cache_path'], entry['version'], entry['year'])
+                                for entry in manifest}, version, cache_path)
+        return cls(feather.read_table(cache_path, memory_map=True), version, cache_path, Delta.load(cache_path), year)
+
+    @classmethod
+    def combine(cls, partitions, version, cache_path=None):
+        """One store over per-year partition stores, with an int16 Year column appended."""
+        tables = []
+        for year, partition in partitions.items():
+            years = pa.array(np.full(partition.num_rows, year, dtype=np.int16))
+            tables.append(partition.table.append_column(pa.field('Year', pa.int16()), years))
+        store = cls(pa.concat_tables(tables), version, cache_path)
+        store.partitions = dict(partitions)
+        return store
+
+    @property
+    def years(self):
+        return list(self.partitions)
+
+    def partition(self, year):
+        """The store of one survey year, or this store for None."""
+        return self if year is None else self.partitions[year]
+
+    @property
+    def num_rows(self):
+        return self.table.num_rows
+
+    @property
+    def column_names(self):
+        """The flat columns; list columns are only available through ragged()."""
+        return [field.name for field in self.table.schema if not pa.types.is_list(field.type)]
+
+    def column(self, name):
+        """Returns one column as a shared Series; callers must not modify it in place."""
+        series = self._columns.get(name)
+        if series is None:
+            with self._lock:
+                series = self._columns.get(name)
+                if series is None:
+                    # String columns come back Arrow-backed (pandas 3's str dtype), not as Python objects
+                    series = self.table.column(name).to_pandas().rename(name)
+                    self._columns[name] = series
+        return series
+
+    def ragged(self, name):
+        """Returns a list column as shared RaggedCodes; callers must not modify the arrays."""
+        codes = self._ragged.get(name)
+        if codes is None:
+            with self._lock:
+                codes = self._ragged.get(name)
+                if codes is None:
+                    codes = RaggedCodes.from_arrow(self.table.column(name))
+                    codes.offsets.setflags(write=False)
+                    codes.values.setflags(write=False)
+                    self._ragged[name] = codes
+        return codes
+
+    def memory_usage(self):
+        """Per-column memory: bytes in the mapped cache file and, once loaded, bytes held by this process."""
+        usage = []
+        for field in self.table.schema:
+            if pa.types.is_list(field.type):
+                loaded = self._ragged.get(field.name)
+                representation = 'ragged codes'
+                in_memory = None if loaded is None else loaded.nbytes
+            else:
+                loaded = self._columns.get(field.name)
+                representation = str(field.type) if loaded is None else str(loaded.dtype)
+                in_memory = None if loaded is None else int(loaded.memory_usage(deep=True, index=False))
+            usage.append({'Column': field.name, 'Representation': representation,
+                          'Mapped (MiB)': round(self.table.column(field.name).nbytes / 2**20, 2),
+                          'Loaded (MiB)': None if in_memory is None else round(in_memory / 2**20, 2)})
+        return usage
+
+    def sort_index(self, name):
+        """Ascending, stable sort order of one column plus each row's rank in it; built once per column."""
+        index = self._sort_orders.get(name)
+        if index is None:
+            series = self.column(name)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # Category codes follow first appearance, so sort by each category's lexical rank
+                category_rank = np.argsort(np.argsort(series.cat.categories.to_numpy(dtype=object)))
+                series = pd.Series(np.append(category_rank, len(category_rank))[series.cat.codes.to_numpy()])
+            order = series.argsort(kind='stable').to_numpy()
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            order.setflags(write=False)
+            rank.setflags(write=False)
+            index = (order, rank)
+            with self._lock:
+                self._sort_orders[name] = index
+        return index
+
+    def sorted_rows(self, name, rows=None, ascending=True):
+        """Orders a row selection (all rows by default) by one column using its pre-sorted index."""
+        order, rank = self.sort_index(name)
+        if rows is not None:
+            if len(rows) * 8 < self.num_rows:
+                # Small selections: sort the selected rows' ranks
+                order = rows[np.argsort(rank[rows], kind='stable')]
+            else:
+                # Large selections: walk the pre-sorted order and keep selected rows
+                selected = np.zeros(self.num_rows, dtype=bool)
+                selected[rows] = True
+                order = order[selected[order]]
+        return order if ascending else order[::-1]
+
+    def frame(self, columns=None, rows=None):
+        """Builds a frame over the shared columns, restricted to the given row positions."""
+        columns = self.column_names if columns is None else columns
+        df = pd.DataFrame({name: self.column(name) for name in columns}, copy=False)
+        if rows is not None:
+            df = df.iloc[rows]
+        return df
@@ -0,0 +1,64 @@
+"""Chunked export of row selections and aggregate tables to CSV or Parquet files.
+
+A selection is read from the shared store EXPORT_CHUNK_ROWS rows at a time and each
+chunk is encoded straight into a temporary file, so encoding never holds the whole
+selection as a frame. Streamlit then reads the finished file into memory to serve
+it, so a download's peak memory is one copy of the encoded file. Exports are meant
+to run when the download is requested, on Streamlit's download thread rather than
+the script thread.
+"""
+import tempfile
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+EXPORT_CHUNK_ROWS = 50_000
+# Label shown for each format: (file extension, MIME type)
+FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def iter_rows(store, rows=None, columns=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Frames over the given row positions (all rows by default), in order, chunk_rows at a time.
+
+    At least one frame is yielded, so an empty selection still exports its columns.
+    """
+    total = store.num_rows if rows is None else len(rows)
+    for start in range(0, max(total, 1), chunk_rows):
+        stop = min(start + chunk_rows, total)
+        yield store.frame(columns, rows=np.arange(start, stop) if rows is None else rows[start:stop])
+
+
+def write_csv(frames, handle):
+    header = True
+    for frame in frames:
+        frame.to_csv(handle, index=False, header=header)
+        header = False
+
+
+def write_parquet(frames, handle):
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(handle, table.schema)
+        writer.write_table(table.cast(writer.schema))
+    if writer is not None:
+        writer.close()
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet}
+
+
+def export_file(frames, extension):
+    """Writes an iterable of frames to a temporary file in the given format; returns it, rewound.
+
+    The file is deleted once closed.
+    """
+    handle = tempfile.TemporaryFile()
+    WRITERS[extension](frames, handle)
+    handle.seek(0)
+    return handle
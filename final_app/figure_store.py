@@ -0,0 +1,42 @@
+"""Process-wide store of built Plotly figures for views that only change with their inputs.
+
+Pages name a figure by (dataset version, page, figure name, options) and give a build
+function; the figure is built once, serialised once, and every later rerun or session
+asking for the same key gets it back from a shared LRU cache bounded by entry count and
+by the size of the serialised specs. st.plotly_chart only accepts figure objects and
+serialises them itself, so the built figure is kept next to its JSON spec, which is
+what the cache is weighed by and what payload measurements read.
+
+Cached figures are shared between sessions and must be treated as read-only.
+"""
+from collections import namedtuple
+
+import plotly.io
+
+from aggregates import LRUCache
+from memory_budget import budget
+
+MAX_FIGURES = 256
+MAX_SPEC_BYTES = 64 * 2**20
+
+CachedFigure = namedtuple('CachedFigure', 'figure spec')
+
+
+def serialise(figure):
+    """Pairs a figure with its JSON spec."""
+    return CachedFigure(figure, plotly.io.to_json(figure, validate=False))
+
+
+class FigureStore:
+    """Built figures and their serialised specs, by (version, page, name, options)."""
+
+    def __init__(self, max_entries=MAX_FIGURES, max_bytes=MAX_SPEC_BYTES):
+        self.cache = LRUCache(max_entries, max_bytes=max_bytes, sizeof=lambda entry: len(entry.spec),
+                              budget=budget, name='figures')
+
+    def get(self, key, build):
+        """Returns the cached figure for key, building and serialising it with build() on a miss."""
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = self.cache.put(key, serialise(build()))
+        return entry
@@ -0,0 +1,230 @@
+"""Incremental upserts of new survey responses into the columnar store.
+
+An upsert takes a batch of responses keyed by ResponseId and writes a new dataset
+version next to the current one: the current rows minus those whose ResponseId is in
+the batch, followed by the batch's rows. Existing record batches are copied as they
+are and only the batch is cleaned and dictionary-encoded, against the current
+dictionaries, so the new version costs a sequential file copy instead of a full
+re-ingest. The new version records its Delta from its parent, and a head file
+next to the source's cache names the latest version so restarts resume from it.
+
+Derived holds one structure built on the dataset (a search index, an engine) per
+version and rebuilds it for a new version: re-sorting a whole index costs about as
+much as patching one. Only the cube, whose rebuild scans every row, is updated from
+the removed and appended rows of the version's delta (see update_cube).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cube import CompensationCube
+from data_source import (CATEGORICAL_COLUMNS, CHUNK_ROWS, RAGGED_COLUMNS, READERS, SCHEMA, DictionaryEncoder,
+                         IngestStats, normalise, to_record_batch)
+from dataset_store import DatasetStore, Delta
+from language_index import LanguageIndex
+
+CUBE_COLUMNS = ['Country', 'DevType', 'YearsCode', 'ConvertedCompYearly']
+
+UpsertResult = namedtuple('UpsertResult', 'store stats replaced')
+
+
+# --- VERSIONS ---
+def _cache_path(cache_dir, version):
+    return os.path.join(cache_dir, f"survey-{version}.arrow")
+
+
+def _head_path(source):
+    return os.path.join(source.cache_dir, f"survey-{source.version}.head")
+
+
+def open_head(source):
+    """The latest upserted version of a source's dataset, or None if nothing was upserted into it."""
+    if not os.path.exists(_head_path(source)):
+        return None
+    with open(_head_path(source)) as handle:
+        version = handle.read().strip()
+    cache_path = _cache_path(source.cache_dir, version)
+    if not os.path.exists(cache_path):
+        return None
+    return DatasetStore.from_cache(cache_path, version)
+
+
+def set_head(source, store):
+    """Makes store the version a restarted server opens for this source."""
+    tmp_path = f"{_head_path(source)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as handle:
+        handle.write(store.version)
+    os.replace(tmp_path, _head_path(source))
+
+
+def remove_version(cache_dir, version):
+    """Deletes an upserted version's files; processes that still map them keep their view."""
+    cache_path = _cache_path(cache_dir, version)
+    for path in (cache_path, Delta.path(cache_path)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# --- UPSERTS ---
+def _dictionary(column):
+    """The values of a dictionary (or list of dictionary) column's newest dictionary."""
+    if column.num_chunks == 0:
+        return []
+    chunk = column.chunks[-1]
+    if pa.types.is_list(chunk.type):
+        chunk = chunk.values
+    return chunk.dictionary.to_pylist()
+
+
+def read_batch(path):
+    """Reads a batch file of raw responses in any of the source formats; returns (frame, IngestStats)."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported data file type '{extension}' for {path}.")
+    stats = IngestStats()
+    chunks = list(READERS[extension](path, CHUNK_ROWS, stats))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(), stats
+
+
+def upsert(store, batch, stats=None):
+    """Writes a new version of the store with the batch's responses upserted by ResponseId.
+
+    Rows whose ResponseId appears in the batch are removed and the batch's rows are
+    appended; within the batch the last response per ResponseId wins. Returns an
+    UpsertResult with the new store, the batch's IngestStats and how many existing
+    rows were replaced. ``stats`` carries on the accounting of reading the batch, if any.
+    """
+    if stats is None:
+        stats = IngestStats()
+        stats.rows_read = len(batch)
+    batch = normalise(batch, stats)
+    deduplicated = batch.drop_duplicates('ResponseId', keep='last')
+    stats.drop('duplicate ResponseId in the batch', len(batch) - len(deduplicated))
+    batch = deduplicated
+    stats.rows_written = len(batch)
+
+    keep = ~store.column('ResponseId').isin(batch['ResponseId']).to_numpy()
+    removed = np.flatnonzero(~keep)
+    digest = hashlib.sha1(store.version.encode())
+    digest.update(pd.util.hash_pandas_object(batch, index=False).to_numpy().tobytes())
+    version = digest.hexdigest()[:16]
+    cache_path = _cache_path(os.path.dirname(store.cache_path), version)
+
+    # New values extend the current dictionaries, so the file can keep storing them as deltas
+    encoders = {column: DictionaryEncoder(_dictionary(store.table.column(column)))
+                for column in CATEGORICAL_COLUMNS + list(RAGGED_COLUMNS)}
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, SCHEMA, options=options) as writer:
+        start = 0
+        for record_batch in store.table.to_batches():
+            mask = keep[start:start + record_batch.num_rows]
+            start += record_batch.num_rows
+            writer.write_batch(record_batch if mask.all() else record_batch.filter(pa.array(mask)))
+        if len(batch):
+            writer.write_batch(to_record_batch(batch, encoders))
+    Delta(store.version, removed, len(batch)).save(cache_path)
+    os.replace(tmp_path, cache_path)
+    return UpsertResult(DatasetStore.from_cache(cache_path, version), stats, len(removed))
+
+
+# --- DERIVED STRUCTURES ---
+class Derived:
+    """A structure built on the dataset by ``build(store)``, kept for the latest versions of each year.
+
+    Each version is built once, outside the lock: sessions asking for a version being
+    built wait for it, and other versions stay available meanwhile. With a ``MemoryBudget``
+    the built values count against it, and the budget may drop the least recently used
+    one, which is then built again on its next request.
+    """
+
+    def __init__(self, build, keep=2, budget=None, name=None):
+        self.build = build
+        self.keep = keep
+        self.budget = budget
+        self.nbytes = 0
+        self.spilled_bytes = 0
+        self._held = OrderedDict()
+        self._sizes = {}
+        self._used = {}
+        self._lock = threading.Lock()
+        if budget is not None:
+            budget.register(self, name or type(self).__name__)
+
+    def get(self, store):
+        with self._lock:
+            held = self._held.get(store.version)
+            if self.budget is not None:
+                self._used[store.version] = self.budget.tick()
+            if held is None:
+                future = Future()
+                self._held[store.version] = (store, future)
+                # Other years' partitions (or the whole dataset) keep their own versions
+                versions = [version for version, (other, _) in self._held.items() if other.year == store.year]
+                for version in versions[:-self.keep]:
+                    self._forget(version)
+        if held is not None:
+            return held[1].result()
+        try:
+            value = self.build(store)
+        except BaseException as error:
+            # Forget the failed build, so the next request for this version tries again
+            with self._lock:
+                if self._held.get(store.version, (None, None))[1] is future:
+                    self._forget(store.version)
+            future.set_exception(error)
+            raise
+        future.set_result(value)
+        if self.budget is not None:
+            size = self.budget.sizeof(value)
+            with self._lock:
+                if self._held.get(store.version, (None, None))[1] is future:
+                    self._sizes[store.version] = size
+                    self.nbytes += size
+            self.budget.enforce()
+        return value
+
+    def _forget(self, version):
+        del self._held[version]
+        self.nbytes -= self._sizes.pop(version, 0)
+        self._used.pop(version, None)
+
+    def oldest(self):
+        """(last-use stamp, version) of the least recently used built value, or None."""
+        with self._lock:
+            built = [(self._used[version], version) for version in self._sizes]
+        return min(built, key=lambda item: item[0]) if built else None
+
+    def release(self, version):
+        """Drops a built value; it is built again when next asked for."""
+        with self._lock:
+            if version in self._sizes:
+                self._forget(version)
+
+    def __len__(self):
+        return len(self._held)
+
+
+def build_language_index(store):
+    return LanguageIndex.from_ragged(store.ragged('LanguageCodes'))
+
+
+def build_cube(store, language_index=None):
+    return CompensationCube(store.frame(CUBE_COLUMNS), language_index or build_language_index(store))
+
+
+def update_cube(cube, parent, store):
+    """Subtracts the parent's removed rows from its cube and adds the store's appended rows."""
+    removed, added = store.delta.removed, store.delta.added_rows(store.num_rows)
+    return cube.updated(parent.frame(CUBE_COLUMNS, rows=removed),
+                        LanguageIndex.from_ragged(parent.ragged('LanguageCodes').take(removed)),
+                        store.frame(CUBE_COLUMNS, rows=added),
+                        LanguageIndex.from_ragged(store.ragged('LanguageCodes').take(added)))
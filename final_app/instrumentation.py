@@ -0,0 +1,186 @@
+"""Lightweight per-rerun timing and memory instrumentation for the app's pages.
+
+Each script run gets a RerunProfile that times named stages (data access, filter,
+aggregate, figure build, render) with perf_counter and samples the process's
+resident memory around them; chart payload sizes are measured when asked for, since
+that means serialising the figure a second time. Finished profiles are folded into a
+process-wide Metrics registry, which keeps per-page, per-stage latency histograms,
+logs every rerun as one JSON line and can write itself in the Prometheus text format.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Write the Prometheus metrics to this file after every rerun when set.
+METRICS_FILE_ENV = 'DATA_EXPLORER_METRICS_FILE'
+METRIC_PREFIX = 'data_explorer'
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger('data_explorer.performance')
+
+
+def rss_bytes():
+    """Resident memory of this process, or None where it cannot be read cheaply."""
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class RerunProfile:
+    """Stage timings, memory deltas and chart payload sizes for one script run."""
+
+    def __init__(self, page=None, measure_payloads=False):
+        self.page = page
+        self.measure_payloads = measure_payloads
+        self.stages = []
+        self.payloads = []
+        self.seconds = None
+        self.rss = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block as one stage; a stage may be entered several times per run."""
+        rss = rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            after = rss_bytes()
+            self.stages.append({'stage': name, 'seconds': time.perf_counter() - start,
+                                'memory_delta': None if rss is None or after is None else after - rss})
+
+    def payload(self, name, size):
+        """Records the serialised size, in bytes, of something sent to the browser."""
+        self.payloads.append({'name': name, 'bytes': int(size)})
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._started
+        self.rss = rss_bytes()
+        return self
+
+    def stage_seconds(self):
+        """Total seconds per stage name, in first-seen order."""
+        totals = {}
+        for stage in self.stages:
+            totals[stage['stage']] = totals.get(stage['stage'], 0.0) + stage['seconds']
+        return totals
+
+    def to_dict(self):
+        return {'page': self.page, 'seconds': self.seconds, 'rss': self.rss,
+                'stages': self.stages, 'payloads': self.payloads}
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus exposes them."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+class Metrics:
+    """Process-wide registry of finished rerun profiles, shared by every session."""
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file or os.environ.get(METRICS_FILE_ENV)
+        self.reruns = {}
+        self.stages = {}
+        self.payload_bytes = {}
+        self.rss = None
+        self.startup = {}
+        self._lock = threading.Lock()
+
+    def record(self, profile):
+        """Folds a finished profile into the registry, logs it and refreshes the metrics file."""
+        with self._lock:
+            self.startup.setdefault('first_render', profile.seconds)
+            self.reruns.setdefault(profile.page, Histogram()).observe(profile.seconds)
+            for stage, seconds in profile.stage_seconds().items():
+                self.stages.setdefault((profile.page, stage), Histogram()).observe(seconds)
+            for payload in profile.payloads:
+                self.payload_bytes[profile.page] = self.payload_bytes.get(profile.page, 0) + payload['bytes']
+            self.rss = profile.rss
+            text = self._prometheus() if self.metrics_file else None
+        logger.info(json.dumps(profile.to_dict()))
+        if text is not None:
+            self._write(text)
+
+    def observe_startup(self, phase, seconds):
+        """Records how long a one-off startup phase took; only the first observation is kept."""
+        with self._lock:
+            self.startup.setdefault(phase, seconds)
+
+    def _write(self, text):
+        tmp_path = f"{self.metrics_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as handle:
+                handle.write(text)
+            os.replace(tmp_path, self.metrics_file)
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.metrics_file, e)
+
+    def summary(self):
+        """Rows of page, stage, runs, mean and max milliseconds, for display."""
+        with self._lock:
+            items = [((page, 'total'), histogram) for page, histogram in self.reruns.items()]
+            items += list(self.stages.items())
+        return [{'Page': page, 'Stage': stage, 'Runs': histogram.count,
+                 'Mean (ms)': round(histogram.sum / histogram.count * 1000, 1),
+                 'Max (ms)': round(histogram.max * 1000, 1)}
+                for (page, stage), histogram in sorted(items)]
+
+    def to_prometheus(self):
+        """The registry in the Prometheus text exposition format."""
+        with self._lock:
+            return self._prometheus()
+
+    def _prometheus(self):
+        lines = []
+
+        def histogram(name, help_text, series):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+            for labels, data in series:
+                label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+                for bound, count in zip(data.buckets, data.counts):
+                    lines.append(f'{METRIC_PREFIX}_{name}_bucket{{{label_text},le="{bound}"}} {count}')
+                lines.append(f'{METRIC_PREFIX}_{name}_bucket{{{label_text},le="+Inf"}} {data.count}')
+                lines.append(f'{METRIC_PREFIX}_{name}_sum{{{label_text}}} {data.sum:.6f}')
+                lines.append(f'{METRIC_PREFIX}_{name}_count{{{label_text}}} {data.count}')
+
+        histogram('rerun_seconds', "Script run time per page.",
+                  [((('page', page),), data) for page, data in sorted(self.reruns.items())])
+        histogram('stage_seconds', "Time spent per page stage in one script run.",
+                  [((('page', page), ('stage', stage)), data) for (page, stage), data in sorted(self.stages.items())])
+        lines.append(f"# HELP {METRIC_PREFIX}_payload_bytes_total Serialised chart and table bytes sent per page.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_payload_bytes_total counter")
+        for page, total in sorted(self.payload_bytes.items()):
+            lines.append(f'{METRIC_PREFIX}_payload_bytes_total{{page="{page}"}} {total}')
+        if self.startup:
+            lines.append(f"# HELP {METRIC_PREFIX}_startup_seconds Duration of one-off startup phases of this process.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_startup_seconds gauge")
+            for phase, seconds in sorted(self.startup.items()):
+                lines.append(f'{METRIC_PREFIX}_startup_seconds{{phase="{phase}"}} {seconds:.6f}')
+        if self.rss is not None:
+            lines.append(f"# HELP {METRIC_PREFIX}_resident_memory_bytes Resident memory of the server process.")
+            lines.append(f"# TYPE {METRIC_PREFIX}_resident_memory_bytes gauge")
+            lines.append(f"{METRIC_PREFIX}_resident_memory_bytes {self.rss}")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,154 @@
+"""Long-form index over the semicolon-separated LanguageHaveWorkedWith column.
+
+The column is split once, when the index is built or, from the columnar cache, at
+ingest time. After that, counts, filters and
+co-occurrence are integer array operations on (respondent, language-code) pairs and
+on a sparse respondent x language matrix.
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from memory_budget import nbytes
+
+SEPARATOR = ';'
+
+
+class LanguageIndex:
+    """Respondent x language incidence, with respondents identified by row position."""
+
+    def __init__(self, vocabulary, respondents, codes, num_respondents):
+        self.vocabulary = vocabulary
+        self.num_respondents = num_respondents
+        self.matrix = sparse.csr_matrix(
+            (np.ones(len(codes), dtype=np.int32), (respondents, codes)),
+            shape=(num_respondents, len(vocabulary)),
+        )
+        self.matrix.sum_duplicates()
+        self.matrix.data[:] = 1
+        # Long-form (respondent, language-code) pairs, deduplicated and in respondent order
+        self.respondents = np.repeat(np.arange(num_respondents), np.diff(self.matrix.indptr))
+        self.codes = self.matrix.indices
+        self._by_language = self.matrix.tocsc()
+        self._codes_by_name = {name: code for code, name in enumerate(vocabulary)}
+        # Alphabetical position of each code, to break count ties by name like the SQL backend
+        self._name_rank = np.argsort(np.argsort(np.asarray(vocabulary, dtype=str), kind='stable'))
+
+    @classmethod
+    def from_series(cls, languages):
+        """Builds the index from a LanguageHaveWorkedWith column."""
+        exploded = languages.reset_index(drop=True).str.split(SEPARATOR).explode().dropna()
+        exploded = exploded[exploded != '']
+        codes, vocabulary = pd.factorize(exploded)
+        return cls(
+            vocabulary=np.asarray(vocabulary, dtype=object),
+            respondents=exploded.index.to_numpy(dtype=np.int64),
+            codes=codes.astype(np.int32),
+            num_respondents=len(languages),
+        )
+
+    @classmethod
+    def from_ragged(cls, ragged):
+        """Builds the index from pre-split language codes (the store's LanguageCodes column)."""
+        return cls(
+            vocabulary=ragged.vocabulary,
+            respondents=np.repeat(np.arange(len(ragged)), np.diff(ragged.offsets)),
+            codes=ragged.values,
+            num_respondents=len(ragged),
+        )
+
+    @property
+    def nbytes(self):
+        matrices = [self.matrix, self._by_language]
+        return nbytes([self.respondents] + [array for matrix in matrices
+                                           for array in (matrix.data, matrix.indices, matrix.indptr)])
+
+    def code(self, language):
+        return self._codes_by_name[language]
+
+    def _select(self, rows):
+        """Restricts the matrix to a boolean mask or array of row positions."""
+        if rows is None:
+            return self.matrix
+        return self.matrix[rows]
+
+    def counts(self, rows=None):
+        """Number of respondents using each language, as an array indexed by code."""
+        if rows is None:
+            return np.bincount(self.matrix.indices, minlength=len(self.vocabulary))
+        return np.asarray(self._select(rows).sum(axis=0)).ravel()
+
+    def ranking(self, counts):
+        """Codes of the languages with a positive count, most popular first and ties by name."""
+        order = np.lexsort((self._name_rank, -counts))
+        return order[counts[order] > 0]
+
+    def top_counts(self, n=None, rows=None):
+        """Most used languages as a Technology/Count frame, most popular first."""
+        counts = self.counts(rows)
+        order = self.ranking(counts)[:n]
+        return pd.DataFrame({'Technology': self.vocabulary[order], 'Count': counts[order]})
+
+    def respondents_with(self, language):
+        """Row positions of respondents who have worked with the given language."""
+        code = self.code(language)
+        start, stop = self._by_language.indptr[code], self._by_language.indptr[code + 1]
+        return self._by_language.indices[start:stop]
+
+    def cooccurrence(self, rows=None):
+        """Language x language matrix of how many respondents use both languages."""
+        selected = self._select(rows)
+        return (selected.T @ selected).toarray()
+
+    def value_quantiles(self, values, quantiles=(0.25, 0.5, 0.75), rows=None):
+        """Per-language quantiles of a per-respondent value (e.g. salary), indexed by language.
+
+        Respondents are ranked by value once, so each (language code, rank) pair packs into
+        a single integer; one sort of those keys groups the pairs by language in value order
+        and each quantile is read off the groups with linear interpolation, as pandas does.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values)
+        if rows is not None:
+            selected = np.zeros(self.num_respondents, dtype=bool)
+            selected[rows] = True
+            keep &= selected
+        by_value = np.argsort(values, kind='stable')
+        ranks = np.empty(self.num_respondents, dtype=np.int64)
+        ranks[by_value] = np.arange(self.num_respondents)
+
+        kept = keep[self.respondents]
+        keys = np.sort(self.codes[kept].astype(np.int64) * self.num_respondents + ranks[self.respondents[kept]])
+        pair_codes = keys // self.num_respondents
+        pair_values = values[by_value[keys % self.num_respondents]]
+
+        sizes = np.bincount(pair_codes, minlength=len(self.vocabulary))
+        present = np.flatnonzero(sizes)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[present]
+        sizes = sizes[present]
+
+        result = pd.DataFrame({'Respondents': sizes}, index=pd.Index(self.vocabulary[present], name='Technology'))
+        for q in quantiles:
+            position = starts + q * (sizes - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, starts + sizes - 1)
+            fraction = position - lower
+            result[q] = pair_values[lower] + (pair_values[upper] - pair_values[lower]) * fraction
+        return result
+
+    def mask(self, languages, match_all=False):
+        """Boolean row mask for respondents using any (or all) of the given languages."""
+        columns = [self.code(language) for language in languages]
+        hits = np.asarray(self._by_language[:, columns].sum(axis=1)).ravel()
+        return hits == len(columns) if match_all else hits > 0
+
+
+def language_analytics(index, salaries, rows=None, top_n=15):
+    """Language counts, co-occurrence of the top languages and their salary quantiles."""
+    tech_df = index.top_counts(rows=rows)
+    top = tech_df['Technology'].head(top_n)
+    codes = [index.code(language) for language in top]
+    cooccurrence_df = pd.DataFrame(index.cooccurrence(rows)[np.ix_(codes, codes)], index=top, columns=top)
+    salary_df = index.value_quantiles(salaries, rows=rows)
+    salary_df = salary_df.loc[top].rename(columns={0.25: 'Q1', 0.5: 'MedianSalary', 0.75: 'Q3'}).reset_index()
+    return tech_df, cooccurrence_df, salary_df
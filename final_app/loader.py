@@ -0,0 +1,125 @@
+"""Background warm-up of the shared dataset.
+
+The loader opens the data source, streams it into its columnar cache and maps the
+store on a daemon thread, so the first page can paint before pandas, pyarrow and the
+data modules have even been imported. Pages that need the data wait for it, showing
+the loader's progress; the rest never block on it.
+
+Once loaded, batches of new responses can be upserted into a single-file dataset:
+each upsert writes a new version and swaps it in as the loader's store, so every
+session's next rerun sees it. If DATA_EXPLORER_INBOX names a directory, the loader
+thread keeps polling it and upserts each batch file dropped there, moving it to
+processed/ (or failed/) afterwards.
+
+This module only imports the standard library; keep it that way.
+"""
+import logging
+import os
+import threading
+import time
+
+INBOX_ENV = 'DATA_EXPLORER_INBOX'
+INBOX_POLL_SECONDS = 5.0
+INBOX_EXTENSIONS = ('.csv', '.parquet', '.arrow', '.feather', '.ipc')
+
+logger = logging.getLogger('data_explorer.loader')
+
+
+class DatasetLoader:
+    """Opens a source, builds its cache and maps its DatasetStore on a background thread."""
+
+    def __init__(self, open_source):
+        self.source = None
+        self.store = None
+        self.error = None
+        self.fraction = 0.0
+        self.rows_read = 0
+        self.seconds = None
+        # (IngestStats, rows replaced) of every batch upserted since the server started
+        self.updates = []
+        self._upsert_lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._load, args=(open_source,), name='dataset-loader', daemon=True)
+        self._thread.start()
+
+    def _load(self, open_source):
+        try:
+            from dataset_store import DatasetStore
+            from incremental import open_head
+            self.source = open_source()
+            self.source.build_cache(self._progress)
+            # Resume from the latest upserted version, if there is one
+            self.store = open_head(self.source) or DatasetStore.from_source(self.source)
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self.seconds = time.perf_counter() - self._started
+            self._done.set()
+        if os.environ.get(INBOX_ENV):
+            self._watch(os.environ[INBOX_ENV])
+
+    def _watch(self, inbox):
+        """Upserts batch files from the inbox directory as they appear, oldest name first."""
+        while True:
+            try:
+                names = sorted(name for name in os.listdir(inbox)
+                               if os.path.splitext(name)[1].lower() in INBOX_EXTENSIONS)
+            except OSError as e:
+                logger.warning("Cannot read the inbox %s: %s", inbox, e)
+                names = []
+            for name in names:
+                path = os.path.join(inbox, name)
+                try:
+                    from incremental import read_batch
+                    batch, stats = read_batch(path)
+                    self.upsert(batch, stats)
+                    outcome = 'processed'
+                except Exception:
+                    logger.exception("Could not upsert %s", path)
+                    outcome = 'failed'
+                os.makedirs(os.path.join(inbox, outcome), exist_ok=True)
+                os.replace(path, os.path.join(inbox, outcome, name))
+            time.sleep(INBOX_POLL_SECONDS)
+
+    def _progress(self, fraction, stats):
+        self.fraction = min(fraction, 1.0)
+        self.rows_read = stats.rows_read
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Waits up to timeout seconds for the load to finish; returns whether it has."""
+        return self._done.wait(timeout)
+
+    def upsert(self, batch, stats=None):
+        """Upserts a frame of raw responses by ResponseId into a new dataset version and swaps it in.
+
+        Returns the batch's IngestStats. Versions older than the previous one are
+        deleted, as nothing updates from them any more.
+        """
+        from incremental import remove_version, set_head, upsert
+        if self.result().partitions:
+            raise ValueError("Responses cannot be upserted into a multi-year dataset; "
+                             "update that year's file instead, and its partition is rebuilt on the next start.")
+        with self._upsert_lock:
+            previous = self.store
+            result = upsert(previous, batch, stats)
+            set_head(self.source, result.store)
+            self.store = result.store
+            self.updates.append((result.stats, result.replaced))
+            if previous.delta is not None and previous.delta.parent != self.source.version:
+                remove_version(self.source.cache_dir, previous.delta.parent)
+        logger.info("Upserted %d responses (%d replaced) into version %s",
+                    result.stats.rows_written, result.replaced, result.store.version)
+        return result.stats
+
+    def result(self):
+        """The mapped store, once loaded; re-raises the error if loading failed."""
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.store
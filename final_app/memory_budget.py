@@ -0,0 +1,189 @@
+"""Process-wide memory budget for cached results and per-session selections.
+
+Caches created with a budget count the bytes of the entries they hold in memory
+against one limit per process (DATA_EXPLORER_MEMORY_BUDGET, e.g. '2GB'). When a put
+takes the process over it, the least recently used entries across all of those caches
+are moved out of memory: frames and arrays are spilled to a local directory as Arrow
+IPC files and read back on their next access, anything else (built figures, tuples of
+results) is dropped and rebuilt on demand. The mapped dataset itself is not counted:
+its pages belong to the shared cache file and the OS can reclaim them at any time.
+
+The limit covers the server and its worker processes together: when the worker pool
+starts, each process gets an equal share of it and enforces that share on its own.
+"""
+import atexit
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+BUDGET_ENV = 'DATA_EXPLORER_MEMORY_BUDGET'
+SPILL_DIR_ENV = 'DATA_EXPLORER_SPILL_DIR'
+DEFAULT_BUDGET = 2**30
+UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+# Schema metadata saying what a spill file holds
+KIND = b'data_explorer.kind'
+
+
+def parse_size(text):
+    """Bytes in a size such as '512MB', '2GiB' or '1073741824'."""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?)(?:i?B)?\s*', text, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid memory size '{text}'; use bytes or a size such as '512MB' or '2GB'.")
+    return int(float(match.group(1)) * UNITS[match.group(2).upper()])
+
+
+def nbytes(value):
+    """Approximate bytes held by a cached value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    return int(getattr(value, 'nbytes', 0))
+
+
+class MemoryBudget:
+    """A byte limit shared by registered caches, enforced by spilling or dropping their least recently used entries."""
+
+    def __init__(self, limit, spill_dir=None):
+        self.total = limit
+        self.limit = limit
+        self.spills = 0
+        self.reloads = 0
+        self.drops = 0
+        self._spill_dir = spill_dir
+        self._caches = weakref.WeakKeyDictionary()
+        self._ticks = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        size = os.environ.get(BUDGET_ENV)
+        return cls(parse_size(size) if size else DEFAULT_BUDGET, os.environ.get(SPILL_DIR_ENV))
+
+    # --- ACCOUNTING ---
+    sizeof = staticmethod(nbytes)
+
+    def share(self, processes):
+        """Limits this process to an equal share of the total, for one of that many processes using it."""
+        self.limit = self.total // processes
+        return self.limit
+
+    def register(self, cache, name):
+        self._caches[cache] = name
+
+    def tick(self):
+        """An increasing stamp, so entries of different caches can be ordered by last access."""
+        return next(self._ticks)
+
+    @property
+    def nbytes(self):
+        return sum(cache.nbytes for cache in list(self._caches.keys()))
+
+    @property
+    def spilled_bytes(self):
+        return sum(cache.spilled_bytes for cache in list(self._caches.keys()))
+
+    def usage(self):
+        """Bytes in memory and on disk, and entry counts, per cache name."""
+        usage = {}
+        for cache, name in list(self._caches.items()):
+            entry = usage.setdefault(name, {'Cache': name, 'In memory (MiB)': 0.0, 'Spilled (MiB)': 0.0, 'Entries': 0})
+            entry['In memory (MiB)'] += cache.nbytes / 2**20
+            entry['Spilled (MiB)'] += cache.spilled_bytes / 2**20
+            entry['Entries'] += len(cache)
+        return [{**entry, 'In memory (MiB)': round(entry['In memory (MiB)'], 2),
+                 'Spilled (MiB)': round(entry['Spilled (MiB)'], 2)} for _, entry in sorted(usage.items())]
+
+    def enforce(self):
+        """Releases the least recently used entries across all caches until usage is within the limit."""
+        if self.nbytes <= self.limit:
+            return
+        # Caches never call back into the budget while holding their own lock, so taking
+        # theirs under this one cannot deadlock
+        with self._lock:
+            while self.nbytes > self.limit:
+                oldest = [(cache.oldest(), cache) for cache in list(self._caches.keys())]
+                oldest = [(entry, cache) for entry, cache in oldest if entry is not None]
+                if not oldest:
+                    break
+                (_, key), cache = min(oldest, key=lambda item: item[0][0])
+                cache.release(key)
+
+    # --- SPILL FILES ---
+    @property
+    def spill_dir(self):
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='data-explorer-spill-')
+            atexit.register(shutil.rmtree, self._spill_dir, True)
+        os.makedirs(self._spill_dir, exist_ok=True)
+        return self._spill_dir
+
+    def spill(self, value):
+        """Writes a frame or 1-D array to an Arrow IPC file; returns its path, or None if the value cannot be spilled."""
+        try:
+            if isinstance(value, pd.DataFrame) and all(isinstance(name, str) for name in value.columns):
+                table, kind = pa.Table.from_pandas(value), b'frame'
+            elif isinstance(value, np.ndarray) and value.ndim == 1 and value.dtype.kind in 'biuf':
+                table, kind = pa.table({'values': value}), value.dtype.str.encode()
+            else:
+                table = None
+        except (pa.ArrowException, TypeError, ValueError):
+            table = None
+        if table is None:
+            self.drops += 1
+            return None
+        path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.arrow")
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), KIND: kind})
+        try:
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        except OSError:
+            # A full or unwritable spill directory degrades to dropping the entry
+            self.discard(path)
+            self.drops += 1
+            return None
+        self.spills += 1
+        return path
+
+    def load(self, path):
+        """Reads a spilled value back into memory and deletes its file."""
+        with pa.memory_map(path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            kind = table.schema.metadata[KIND]
+            if kind == b'frame':
+                value = table.to_pandas()
+            else:
+                value = table.column('values').to_numpy().astype(np.dtype(kind.decode()), copy=True)
+        self.discard(path)
+        self.reloads += 1
+        return value
+
+    def discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def discard_all(self, spilled):
+        """Deletes the spill files of a cache's (key -> (path, size)) spilled entries."""
+        for path, _ in list(spilled.values()):
+            self.discard(path)
+
+
+# The budget of this process; each server process (and worker) enforces its own share
+budget = MemoryBudget.from_env()
@@ -0,0 +1,146 @@
+"""Search index over the EmployeeName column for the Data Explorer.
+
+Names are lower-cased and deduplicated, then indexed three ways: a trigram inverted
+index (substring and fuzzy matches), a sorted name array (prefix matches) and a
+name -> rows posting list, so every search returns row positions without scanning
+the column.
+"""
+import numpy as np
+import pandas as pd
+
+from memory_budget import nbytes
+
+# Names are padded with one space on each side, so word starts and ends get their own trigrams.
+PAD = ' '
+BUILD_CHUNK = 100_000
+FUZZY_THRESHOLD = 0.3
+
+
+def _trigram_keys(strings):
+    """(string index, trigram key) pairs for an array of strings, computed on code points."""
+    width = max(3, max((len(s) for s in strings), default=0))
+    points = np.array(strings, dtype=f'U{width}').view(np.uint32).reshape(len(strings), width).astype(np.int64)
+    keys = (points[:, :-2] << 42) | (points[:, 1:-1] << 21) | points[:, 2:]
+    valid = (points[:, :-2] > 0) & (points[:, 1:-1] > 0) & (points[:, 2:] > 0)
+    owners, _ = np.nonzero(valid)
+    return owners, keys[valid]
+
+
+def _name_trigrams(names, first_id=0):
+    """(name id, trigram key) pairs for names numbered from first_id, in chunks to bound the code-point buffer."""
+    padded = (PAD + names + PAD).to_numpy(dtype=object)
+    owners, keys = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for start in range(0, len(padded), BUILD_CHUNK):
+        chunk_owners, chunk_keys = _trigram_keys(padded[start:start + BUILD_CHUNK])
+        owners.append(chunk_owners + first_id + start)
+        keys.append(chunk_keys)
+    return np.concatenate(owners), np.concatenate(keys)
+
+
+def _postings(owners, keys):
+    """Groups owners by key into (sorted unique keys, offsets, owners) arrays, deduplicated."""
+    order = np.lexsort((owners, keys))
+    keys, owners = keys[order], owners[order]
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = (keys[1:] != keys[:-1]) | (owners[1:] != owners[:-1])
+    keys, owners = keys[distinct], owners[distinct]
+    unique_keys, starts = np.unique(keys, return_index=True)
+    return unique_keys, np.append(starts, len(keys)), owners
+
+
+class NameIndex:
+    """Trigram, prefix and posting-list index from lower-cased names to row positions."""
+
+    def __init__(self, names):
+        codes, uniques = pd.factorize(names.str.lower())
+        uniques = pd.Series(uniques, dtype='string')
+        self._build(codes, uniques, *_name_trigrams(uniques))
+
+    def _build(self, codes, names, owners, keys):
+        """Indexes rows by name id (codes), given the names and their (name id, trigram) pairs."""
+        self.codes = codes
+        self.names = names
+        self.num_rows = len(codes)
+
+        # Rows grouped by name id
+        self._row_order = np.argsort(codes, kind='stable')
+        self._row_offsets = np.searchsorted(codes[self._row_order], np.arange(len(names) + 1))
+
+        # Sorted names for prefix search
+        self._sorted_ids = np.argsort(names.to_numpy(dtype=object), kind='stable')
+        self._sorted_names = names.to_numpy(dtype=object)[self._sorted_ids]
+
+        # Trigram inverted index
+        self._trigrams, self._trigram_offsets, self._trigram_names = _postings(owners, keys)
+        self._trigram_counts = np.bincount(self._trigram_names, minlength=len(names))
+
+    @classmethod
+    def from_series(cls, names):
+        return cls(names.fillna('').astype(str))
+
+    @property
+    def nbytes(self):
+        # The sorted names are separate string objects, about as large as the names themselves
+        return nbytes([self.codes, self._row_order, self._row_offsets, self._sorted_ids, self._trigrams,
+                       self._trigram_offsets, self._trigram_names, self._trigram_counts]) + 2 * nbytes(self.names)
+
+    def _posting(self, key):
+        slot = np.searchsorted(self._trigrams, key)
+        if slot == len(self._trigrams) or self._trigrams[slot] != key:
+            return np.empty(0, dtype=np.int64)
+        return self._trigram_names[self._trigram_offsets[slot]:self._trigram_offsets[slot + 1]]
+
+    def _query_trigrams(self, query):
+        _, keys = _trigram_keys(np.array([query], dtype=object))
+        return np.unique(keys)
+
+    def rows_for(self, name_ids):
+        """Row positions of every row whose name is one of the given name ids, in that order."""
+        name_ids = np.asarray(name_ids, dtype=np.int64)
+        starts = self._row_offsets[name_ids]
+        lengths = self._row_offsets[name_ids + 1] - starts
+        within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return self._row_order[np.repeat(starts, lengths) + within]
+
+    def substring(self, query):
+        """Name ids containing the query, via trigram posting-list intersection then verification."""
+        query = query.lower()
+        keys = self._query_trigrams(query)
+        if len(keys) == 0:
+            candidates = np.arange(len(self.names))
+        else:
+            postings = sorted((self._posting(key) for key in keys), key=len)
+            candidates = postings[0]
+            for posting in postings[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+        matches = self.names.iloc[candidates].str.contains(query, regex=False).to_numpy(dtype=bool)
+        return candidates[matches]
+
+    def prefix(self, query):
+        """Name ids starting with the query, via binary search over the sorted names."""
+        query = query.lower()
+        low = np.searchsorted(self._sorted_names, query, side='left')
+        high = np.searchsorted(self._sorted_names, query + '\U0010ffff', side='right')
+        return np.sort(self._sorted_ids[low:high])
+
+    def fuzzy(self, query, threshold=FUZZY_THRESHOLD):
+        """Name ids by trigram similarity (shared / union of trigrams), best match first."""
+        keys = self._query_trigrams(PAD + query.lower() + PAD)
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        postings = np.concatenate([self._posting(key) for key in keys])
+        shared = np.bincount(postings, minlength=len(self.names))
+        candidates = np.flatnonzero(shared)
+        score = shared[candidates] / (len(keys) + self._trigram_counts[candidates] - shared[candidates])
+        keep = score >= threshold
+        candidates, score = candidates[keep], score[keep]
+        return candidates[np.argsort(-score, kind='stable')]
+
+    def search(self, query, mode='substring'):
+        """Row positions matching the query; substring and prefix rows are in table order."""
+        if mode == 'fuzzy':
+            return self.rows_for(self.fuzzy(query))
+        name_ids = self.prefix(query) if mode == 'prefix' else self.substring(query)
+        return np.sort(self.rows_for(name_ids))
@@ -0,0 +1,44 @@
+"""Level-of-detail reduction for large scatter plots, computed on the server.
+
+Above a point threshold a scatter is replaced either by per-group 2D bins (one marker
+per occupied cell, sized by its count) or by a stratified sample that keeps every
+group's share of the points, so the figure payload stays bounded.
+"""
+import numpy as np
+import pandas as pd
+
+POINT_THRESHOLD = 5000
+GRID_SIZE = 40
+
+
+def bin_points(df, x, y, group, x_range, y_range, bins=GRID_SIZE):
+    """Counts points per (group, x bin, y bin) cell; returns occupied cells with their centres."""
+    x_low, x_high = x_range
+    y_low, y_high = y_range
+    x_width = (x_high - x_low) / bins or 1
+    y_width = (y_high - y_low) / bins or 1
+    x_bin = np.clip(((df[x].to_numpy(dtype=np.float64) - x_low) / x_width).astype(np.int64), 0, bins - 1)
+    y_bin = np.clip(((df[y].to_numpy(dtype=np.float64) - y_low) / y_width).astype(np.int64), 0, bins - 1)
+    group_codes, groups = pd.factorize(df[group], sort=True)
+
+    cells = np.bincount((group_codes * bins + x_bin) * bins + y_bin, minlength=len(groups) * bins * bins)
+    occupied = np.flatnonzero(cells)
+    cell_group, cell_xy = np.divmod(occupied, bins * bins)
+    cell_x, cell_y = np.divmod(cell_xy, bins)
+    return pd.DataFrame({
+        group: np.asarray(groups)[cell_group],
+        x: x_low + (cell_x + 0.5) * x_width,
+        y: y_low + (cell_y + 0.5) * y_width,
+        'Count': cells[occupied],
+    })
+
+
+def stratified_sample(df, group, n, seed=0):
+    """Samples about n rows, allocating to each group in proportion to its size (at least one each)."""
+    if len(df) <= n:
+        return df
+    shuffled = df.iloc[np.random.default_rng(seed).permutation(len(df))]
+    sizes = shuffled[group].value_counts()
+    quotas = np.maximum(1, np.round(sizes * n / len(df))).astype(np.int64)
+    keep = shuffled.groupby(group, observed=True).cumcount().to_numpy() < shuffled[group].map(quotas).to_numpy()
+    return shuffled[keep]
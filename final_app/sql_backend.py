@@ -0,0 +1,249 @@
+"""Optional out-of-core query backend: the analysis pages' work as SQL over Parquet files.
+
+With DATA_EXPLORER_BACKEND=duckdb the Technology, Career and Global Insights pages
+send their filters and aggregates to an embedded DuckDB database instead of building
+language indexes, cubes and filter masks over the dataset in memory. Each cache file
+gets a Parquet copy next to it, written once record batch by record batch, with the
+dictionary columns as plain strings and the languages as a list of names. DuckDB
+scans those files with projection and predicate pushdown, so a query only reads the
+columns and row groups it needs and only its small result comes back to pandas;
+memory stays far below the size of the dataset.
+
+DuckDB is an optional dependency, imported when the first engine is created.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from aggregates import LRUCache, canonical
+from cube import EXPERIENCE_BANDS, EXPERIENCE_LABELS
+from memory_budget import budget
+from scatter_lod import GRID_SIZE
+
+# Let DuckDB use at most this much memory (e.g. '2GB'); beyond it, operators spill to disk.
+MEMORY_LIMIT_ENV = 'DATA_EXPLORER_DUCKDB_MEMORY'
+MAX_RESULTS = 256
+MAX_RESULT_BYTES = 256 * 2**20
+FETCH_ROWS = 50_000
+
+SQL_OPERATORS = {'==': '=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+EXPERIENCE_BAND = 'CASE {} ELSE {} END'.format(
+    ' '.join(f"WHEN YearsCode < {upper} THEN '{label}'" for upper, label in zip(EXPERIENCE_BANDS[1:], EXPERIENCE_LABELS)),
+    f"'{EXPERIENCE_LABELS[-1]}'")
+# Cube dimensions as SQL expressions over the survey_languages view
+DIMENSIONS = {
+    'Country': 'Country',
+    'DevType': 'DevType',
+    'ExperienceBand': EXPERIENCE_BAND,
+    'Language': 'Language',
+}
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+# --- PARQUET COPIES ---
+def parquet_path(cache_path):
+    return os.path.splitext(cache_path)[0] + '.parquet'
+
+
+def _parquet_batch(batch, year):
+    """A cache record batch with strings for dictionaries, Languages for the language codes and the Year."""
+    columns, fields = [], []
+    for field, column in zip(batch.schema, batch.columns):
+        if field.name == 'LanguageHaveWorkedWith':
+            continue
+        if field.name == 'LanguageCodes':
+            field, column = pa.field('Languages', pa.list_(pa.string())), column.cast(pa.list_(pa.string()))
+        elif pa.types.is_dictionary(field.type):
+            field, column = pa.field(field.name, field.type.value_type), column.cast(field.type.value_type)
+        fields.append(field)
+        columns.append(column)
+    if year is not None:
+        fields.append(pa.field('Year', pa.int16()))
+        columns.append(pa.array(np.full(batch.num_rows, year, dtype=np.int16)))
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields))
+
+
+def write_parquet(cache_path, year=None):
+    """Writes the Parquet copy of a cache file unless it exists; returns its path."""
+    path = parquet_path(cache_path)
+    if os.path.exists(path):
+        return path
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.memory_map(cache_path) as source:
+        reader = pa.ipc.open_file(source)
+        schema = _parquet_batch(pa.RecordBatch.from_pylist([], schema=reader.schema), year).schema
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for i in range(reader.num_record_batches):
+                writer.write_table(_parquet_batch(reader.get_batch(i), year))
+    os.replace(tmp_path, path)
+    return path
+
+
+# --- QUERIES ---
+def _where(filters):
+    """SQL conditions and parameters for (column, op, value) predicates."""
+    clauses, params = [], []
+    for column, op, value in canonical(filters):
+        if op == 'in':
+            clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{_quote(column)} {SQL_OPERATORS[op]} ?")
+            params.append(value)
+    return clauses, params
+
+
+def _cube_where(filters):
+    """SQL conditions and parameters for cube filters, which map a dimension to the labels to keep."""
+    clauses, params = [], []
+    for name, values in (filters or {}).items():
+        if values:
+            clauses.append(f"{DIMENSIONS[name]} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    return clauses, params
+
+
+def _clause(clauses):
+    return f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+class SQLEngine:
+    """Answers the analysis pages' queries for one dataset (or year partition) from its Parquet copies.
+
+    Besides its own methods it offers the compensation cube's values() and rollup(), with
+    exact quantiles, so pages can use it wherever they use a cube. Results are cached per
+    query and shared between sessions; treat them as read-only.
+    """
+
+    relative_accuracy = 0.0
+
+    def __init__(self, store):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The SQL backend needs DuckDB; install it with 'pip install -r requirements-duckdb.txt'.") from e
+        partitions = list(store.partitions.values()) or [store]
+        self.version = store.version
+        self.files = [write_parquet(partition.cache_path, partition.year) for partition in partitions]
+        config = {'temp_directory': os.path.join(os.path.dirname(store.cache_path), 'duckdb-tmp')}
+        if os.environ.get(MEMORY_LIMIT_ENV):
+            config['memory_limit'] = os.environ[MEMORY_LIMIT_ENV]
+        self._connection = duckdb.connect(config=config)
+        files = ', '.join("'" + path.replace("'", "''") + "'" for path in self.files)
+        # A respondent's spellings of one language all count once, as in the language index
+        self._connection.execute(f"CREATE VIEW survey AS SELECT * REPLACE (list_distinct(Languages) AS Languages) "
+                                 f"FROM read_parquet([{files}])")
+        # One row per (respondent, language) pair, as in the language cube
+        self._connection.execute("CREATE VIEW survey_languages AS "
+                                 "SELECT * EXCLUDE (Languages), UNNEST(Languages) AS Language FROM survey")
+        self.cache = LRUCache(MAX_RESULTS, MAX_RESULT_BYTES, budget=budget, name='sql')
+
+    def query(self, sql, params=()):
+        """Runs a query on its own cursor, so sessions can query concurrently; returns a cached DataFrame."""
+        key = (sql, tuple(tuple(param) if isinstance(param, list) else param for param in params))
+        result = self.cache.get(key)
+        if result is None:
+            result = self.cache.put(key, self._connection.cursor().execute(sql, list(params)).df())
+        return result
+
+    def iter_query(self, sql, params=(), chunk_rows=FETCH_ROWS):
+        """Streams a query's result as DataFrames of at most chunk_rows rows."""
+        reader = self._connection.cursor().execute(sql, list(params)).fetch_record_batch(chunk_rows)
+        for batch in reader:
+            yield batch.to_pandas()
+
+    # --- CUBE INTERFACE ---
+    def values(self, dimension):
+        if dimension == 'ExperienceBand':
+            return list(EXPERIENCE_LABELS)
+        source = 'survey_languages' if dimension == 'Language' else 'survey'
+        expression = DIMENSIONS.get(dimension, _quote(dimension))
+        result = self.query(f"SELECT DISTINCT {expression} AS value FROM {source} WHERE value IS NOT NULL ORDER BY value")
+        return result['value'].tolist()
+
+    def rollup(self, by, filters=None, quantiles=(0.5,)):
+        """Count, Sum, Mean and salary quantiles grouped by cube dimensions, like CompensationCube.rollup."""
+        filters = {name: values for name, values in (filters or {}).items() if values}
+        by = list(by)
+        source = 'survey_languages' if 'Language' in by or 'Language' in filters else 'survey'
+        clauses, params = _cube_where(filters)
+        groups = ', '.join(f"{DIMENSIONS[name]} AS {_quote(name)}" for name in by)
+        columns = ', '.join(f"quantile_cont(ConvertedCompYearly, {q}) AS q{i}" for i, q in enumerate(quantiles))
+        result = self.query(f"SELECT {groups}, count(*) AS Count, sum(ConvertedCompYearly) AS Sum, {columns} "
+                            f"FROM {source}{_clause(clauses)} GROUP BY ALL ORDER BY ALL", params)
+        result = result.rename(columns={f'q{i}': q for i, q in enumerate(quantiles)})
+        result.insert(len(by) + 2, 'Mean', result['Sum'] / result['Count'])
+        return result
+
+    # --- PAGE QUERIES ---
+    def count(self, filters):
+        """Number of respondents matching the predicates."""
+        clauses, params = _where(filters)
+        return int(self.query(f"SELECT count(*) AS n FROM survey{_clause(clauses)}", params)['n'].iloc[0])
+
+    def language_analytics(self, filters, top_n=15):
+        """Language counts, co-occurrence of the top languages and their salary quantiles, like language_analytics."""
+        clauses, params = _where(filters)
+        tech_df = self.query(f"SELECT Language AS Technology, count(*) AS Count FROM survey_languages"
+                             f"{_clause(clauses + ['Language IS NOT NULL'])} GROUP BY ALL ORDER BY Count DESC, Technology",
+                             params)
+        top = tech_df['Technology'].head(top_n).tolist()
+
+        # Each respondent's top languages, paired with each other
+        pairs = self.query(f"SELECT a, b, count(*) AS n FROM (SELECT a, UNNEST(languages) AS b FROM ("
+                           f"SELECT UNNEST(languages) AS a, languages FROM ("
+                           f"SELECT list_filter(Languages, l -> list_contains(?, l)) AS languages FROM survey"
+                           f"{_clause(clauses)}))) GROUP BY ALL", [top] + params)
+        cooccurrence_df = pairs.pivot(index='a', columns='b', values='n').reindex(index=top, columns=top).fillna(0)
+        cooccurrence_df = cooccurrence_df.astype(np.int64).rename_axis(index=None, columns=None)
+
+        salary_df = self.query(
+            f"SELECT Language AS Technology, count(ConvertedCompYearly) AS Respondents, "
+            f"quantile_cont(ConvertedCompYearly, 0.25) AS Q1, quantile_cont(ConvertedCompYearly, 0.5) AS MedianSalary, "
+            f"quantile_cont(ConvertedCompYearly, 0.75) AS Q3 FROM survey_languages"
+            f"{_clause(clauses + ['list_contains(?, Language)'])} GROUP BY ALL", params + [top])
+        salary_df = salary_df.set_index('Technology').reindex(top).reset_index()
+        return tech_df, cooccurrence_df, salary_df
+
+    def points(self, columns, filters, n=None, group=None):
+        """The matching respondents' columns; with n, about n of them sampled in proportion to each group's size."""
+        clauses, params = _where(filters)
+        select = ', '.join(_quote(column) for column in columns)
+        if n is None:
+            return self.query(f"SELECT {select} FROM survey{_clause(clauses)}", params)
+        # A hash of the ResponseId orders each group at random, but the same way on every run
+        return self.query(
+            f"SELECT {select} FROM (SELECT *, row_number() OVER (PARTITION BY {_quote(group)} ORDER BY hash(ResponseId)) "
+            f"AS rank, count(*) OVER (PARTITION BY {_quote(group)}) AS size, count(*) OVER () AS total "
+            f"FROM survey{_clause(clauses)}) WHERE rank <= greatest(1, round(size * ? / total))", params + [n])
+
+    def iter_points(self, columns, filters, chunk_rows=FETCH_ROWS):
+        """Streams the matching respondents' columns, chunk_rows at a time."""
+        clauses, params = _where(filters)
+        select = ', '.join(_quote(column) for column in columns)
+        yield from self.iter_query(f"SELECT {select} FROM survey{_clause(clauses)}", params, chunk_rows)
+
+    def scatter_bins(self, filters, x, y, group, x_range, y_range, bins=GRID_SIZE):
+        """Counts matching respondents per (group, x bin, y bin) cell, like scatter_lod.bin_points."""
+        clauses, params = _where(filters)
+        x_low, x_high = x_range
+        y_low, y_high = y_range
+        x_width = (x_high - x_low) / bins or 1
+        y_width = (y_high - y_low) / bins or 1
+        cell = "least(greatest(floor(({} - ?) / ?), 0), {})"
+        result = self.query(
+            f"SELECT {_quote(group)}, {cell.format(_quote(x), bins - 1)} AS x_bin, {cell.format(_quote(y), bins - 1)} "
+            f"AS y_bin, count(*) AS Count FROM survey{_clause(clauses)} GROUP BY ALL ORDER BY ALL",
+            [x_low, x_width, y_low, y_width] + params)
+        return pd.DataFrame({
+            group: result[group],
+            x: x_low + (result['x_bin'] + 0.5) * x_width,
+            y: y_low + (result['y_bin'] + 0.5) * y_width,
+            'Count': result['Count'],
+        })